@@ -54,6 +54,55 @@ function Chat({ botType, courseId, userId, externalPrompt, historyEnabled }) {
     }
   };
   
+  // ---------- Read Streamed Chat Response ----------
+  // Reads Server-Sent Events from /api/chat and grows the AI bubble as deltas arrive
+  const readChatStream = async (response) => {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let started = false;
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // SSE events are separated by a blank line
+      const events = buffer.split('\n\n');
+      buffer = events.pop();
+
+      for (const event of events) {
+        if (!event.startsWith('data: ')) continue;
+        const data = JSON.parse(event.slice(6));
+
+        if (data.error) {
+          throw new Error(data.error);
+        }
+
+        if (data.delta) {
+          if (!started) {
+            // first token: swap typing dots for a new AI bubble
+            started = true;
+            setIsTyping(false);
+            setMessages((prev) => [...prev, { sender: 'ai', text: data.delta }]);
+          } else {
+            setMessages((prev) => {
+              const updated = [...prev];
+              const last = updated[updated.length - 1];
+              updated[updated.length - 1] = { ...last, text: last.text + data.delta };
+              return updated;
+            });
+          }
+          scrollToBottom();
+        }
+      }
+    }
+
+    if (!started) {
+      setMessages((prev) => [...prev, { sender: 'ai', text: 'No response' }]);
+    }
+  };
+
   // ---------- Send Prompt to Flask Chat Endpoint ----------
   // Sends user or system message to the backend and stores AI's response
   const sendToBot = async (promptText) => {
@@ -64,9 +113,16 @@ function Chat({ botType, courseId, userId, externalPrompt, historyEnabled }) {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         credentials: 'include',
-        body: JSON.stringify({ botType, prompt: promptText, courseId, userId, historyEnabled }),
+        body: JSON.stringify({ botType, prompt: promptText, courseId, userId, historyEnabled, stream: true }),
       });
 
+      // Streamed answers arrive as Server-Sent Events
+      const contentType = response.headers.get('Content-Type') || '';
+      if (contentType.includes('text/event-stream')) {
+        await readChatStream(response);
+        return;
+      }
+
       const data = await response.json(); // parse backend response
 
       // Detect if the response is a safety warning
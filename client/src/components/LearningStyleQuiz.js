@@ -64,6 +64,7 @@ function LearningStyleQuiz() {
       const res = await fetch(`${process.env.REACT_APP_API_URL}/save-preferences`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
+        credentials: 'include', // receive the refreshed session cookie
         body: JSON.stringify({ user_id: user.user_id, preferences }),
       });
 
@@ -45,6 +45,7 @@ const Profile = () => {
       const response = await fetch(`${process.env.REACT_APP_API_URL}/update-profile`, {
         method: 'PUT',
         headers: { 'Content-Type': 'application/json' },
+        credentials: 'include', // receive the refreshed session cookie
         body: JSON.stringify({ user_id: user.user_id, ...formData }),
       });
 
@@ -70,6 +71,7 @@ const Profile = () => {
       const response = await fetch(`${process.env.REACT_APP_API_URL}/change-password`, {
         method: 'PUT',
         headers: { 'Content-Type': 'application/json' },
+        credentials: 'include', // keep this device's session after the change
         body: JSON.stringify({
           user_id: user.user_id,
           currentPassword: passwordData.currentPassword,
@@ -16,10 +16,8 @@ Core Features:
   - Pie chart visualization of assignment completion status
 
 Data Sources:
-  - /enrolled-courses/:user_id          → User's course enrollment
-  - /api/grades/:user_id                → User's assignment grades
-  - /api/course-progress/:user_id       → Completion % per course
-  - /api/completion-counts/:user_id     → Assignment completion summary
+  - /api/dashboard/:user_id             → Enrolled courses, grades, completion % per course
+                                          and assignment completion summary in one request
   - /get-preferences                    → Learning style preference check
   - /update-history-setting             → Update semantic memory toggle
 
@@ -60,6 +58,7 @@ function Dashboard() {
   const { user, setUser } = useUser();
   const [hasPreferences, setHasPreferences] = useState(false);
   const [completionCounts, setCompletionCounts] = useState({ completed: 0, total: 0 });
+  const [gradeData, setGradeData] = useState(null);
 
 
 /* ------------------------------ Effect: Get Learning Preferences ------------------------------
@@ -93,53 +92,32 @@ function Dashboard() {
   }, []);
 
 
-  /* ------------------------------ Effect: Fetch Enrolled Courses ------------------------------
-     - Retrieves all courses the user is enrolled in
-     - Populates `courses` state used in the carousel
+  /* ------------------------------ Effect: Fetch Dashboard Data ------------------------------
+     - One request returns enrolled courses, course progress, completion counts and grades
+     - Populates `courses` for the carousel
+     - Converts progress array into a dictionary { course_code: percent } for progress bars
+     - Completion counts populate the pie chart in the Analysis section
+     - Grades + enrollments are handed to DashboardGrades so it does not refetch them
   --------------------------------------------------------------------------------------------- */
   useEffect(() => {
-    if (user) {
-      fetch(`${process.env.REACT_APP_API_URL}/enrolled-courses/${user.user_id}`)
-        .then((response) => response.json())
-        .then((data) => setCourses(data))
-        .catch((error) => console.error('Error fetching enrolled courses:', error));
-    }
-  }, [user]);
-
-
-  /* ------------------------------ Effect: Fetch Course Progress ------------------------------
-     - Gets assignment completion % per course for progress bars
-     - Converts array into a dictionary { course_code: percent }
-  ---------------------------------------------------------------------------------------------- */
-  useEffect(() => {
-    if (user) {
-      fetch(`${process.env.REACT_APP_API_URL}/api/course-progress/${user.user_id}`)
+    if (user?.user_id) {
+      fetch(`${process.env.REACT_APP_API_URL}/api/dashboard/${user.user_id}`)
         .then((res) => res.json())
         .then((data) => {
+          setCourses(data.enrolled_courses);
+
           // Convert array of { course_code, progress } to a dictionary
           const progressMap = {};
-          data.forEach((item) => {
+          data.course_progress.forEach((item) => {
             progressMap[item.course_code] = parseFloat(item.progress);
           });
           setCourseProgress(progressMap);
-        })
-        .catch((err) => console.error("Error fetching course progress:", err));
-    }
-  }, [user]);
-  
 
-  /* --------------------------- Effect: Fetch Assignment Completion Summary ---------------------------
-     - Gets total # of assignments and how many are completed
-     - Used to populate the pie chart in the Analysis section
-  ------------------------------------------------------------------------------------------------------ */
-  useEffect(() => {
-    if (user?.user_id) {
-      fetch(`${process.env.REACT_APP_API_URL}/api/completion-counts/${user.user_id}`)
-        .then(res => res.json())
-        .then(data => setCompletionCounts(data))
-        .catch(err => console.error("Error fetching assignment completion counts:", err));
+          setCompletionCounts(data.completion_counts);
+          setGradeData({ grades: data.grades, enrollments: data.enrolled_courses });
+        })
+        .catch((err) => console.error('Error fetching dashboard data:', err));
     }
-
   }, [user]);
   
   /* ------------------------------ Render Dashboard Layout ------------------------------ */
@@ -183,6 +161,7 @@ function Dashboard() {
                       const res = await fetch(`${process.env.REACT_APP_API_URL}/update-history-setting`, {
                         method: 'POST',
                         headers: { 'Content-Type': 'application/json' },
+                        credentials: 'include', // receive the refreshed session cookie
                         body: JSON.stringify({
                           user_id: user.user_id,
                           history_enabled: updated,
@@ -217,7 +196,7 @@ function Dashboard() {
       <Row className='Analysis gx-4 gy-3 mt-2 align-items-start'>
         <Col md={5} className='grades-section'>
           <h1>Grades</h1>
-          <DashboardGrades userId={user?.user_id} />
+          {gradeData && <DashboardGrades userId={user?.user_id} preloaded={gradeData} />}
         </Col>
         <Col md={5} className="analysis-panel">
           <h1>Analysis</h1>
@@ -37,24 +37,29 @@ function groupGradesByCourseAndModule(grades) {
 }
 
 /* -------------------------- DashboardGrades Component --------------------------
-   - Fetches user grades and enrolled courses
+   - Fetches user grades and enrolled courses (or uses `preloaded` from the dashboard endpoint)
    - Renders an accordion section for each course
    - Each course lists grades by module and computes totals
 -------------------------------------------------------------------------------- */
-function DashboardGrades({ userId, filterCourse, onAssignmentSelect }) {
+function DashboardGrades({ userId, filterCourse, onAssignmentSelect, preloaded }) {
   const [grades, setGrades] = useState([]);
   const [enrollments, setEnrollments] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
 	/* ----------------------- Fetch grades + enrollments on load ----------------------- */
+	// `preloaded` ({ grades, enrollments }) comes from the dashboard endpoint and skips both requests
   useEffect(() => {
     setLoading(true);
 
-    Promise.all([
-      fetch(`${process.env.REACT_APP_API_URL}/api/grades/${userId}`).then(res => res.json()),
-      fetch(`${process.env.REACT_APP_API_URL}/enrolled-courses/${userId}`).then(res => res.json())
-    ])
+    const load = preloaded
+      ? Promise.resolve([preloaded.grades, preloaded.enrollments])
+      : Promise.all([
+          fetch(`${process.env.REACT_APP_API_URL}/api/grades/${userId}`).then(res => res.json()),
+          fetch(`${process.env.REACT_APP_API_URL}/enrolled-courses/${userId}`).then(res => res.json())
+        ]);
+
+    load
       .then(([gradeData, courseData]) => {
 				// Optional filtering for a specific course
 				console.log("Fetched grades:", gradeData);
@@ -70,7 +75,7 @@ function DashboardGrades({ userId, filterCourse, onAssignmentSelect }) {
         setError('Failed to load grades or enrollments');
         setLoading(false);
       });
-  }, [userId, filterCourse]);
+  }, [userId, filterCourse, preloaded]);
 
 	// Show loading spinner while fetching
   if (loading) return <div className="text-center"><Spinner animation="border" /><p>Loading grades...</p></div>;
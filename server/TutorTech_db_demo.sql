@@ -663,3 +663,94 @@ INSERT INTO assignment_questions (assignment_id, question_text, question_type, o
 
 ('ASGMT12', 'Define p-value and its role in hypothesis testing.', 'text',
  NULL, '["probability", "null", "significance"]'::jsonb, 5);
+
+---------------------------- (11) Create AI grading cache  --------------------------
+-- question_version is bumped whenever a question's rubric changes so cached grades are never reused
+ALTER TABLE assignment_questions ADD COLUMN question_version INT NOT NULL DEFAULT 1;
+
+-- memoized GPT-4o grades for free-response answers
+-- cache_key = sha256 of (question_version, keyword list, max_points, normalized answer)
+CREATE TABLE IF NOT EXISTS grading_cache (
+    question_id INT NOT NULL,
+    question_version INT NOT NULL,
+    cache_key CHAR(64) NOT NULL,
+    score NUMERIC(5, 2) NOT NULL,
+    reasoning TEXT,
+    created_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (question_id, cache_key),
+    FOREIGN KEY (question_id) REFERENCES assignment_questions(question_id) ON DELETE CASCADE
+);
+
+-- invalidate cached grades when correct_answer, max_points or question_text changes
+CREATE OR REPLACE FUNCTION invalidate_grading_cache() RETURNS trigger AS $$
+BEGIN
+    IF NEW.correct_answer IS DISTINCT FROM OLD.correct_answer
+       OR NEW.max_points IS DISTINCT FROM OLD.max_points
+       OR NEW.question_text IS DISTINCT FROM OLD.question_text THEN
+        NEW.question_version := OLD.question_version + 1;
+        DELETE FROM grading_cache WHERE question_id = OLD.question_id;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_invalidate_grading_cache ON assignment_questions;
+CREATE TRIGGER trg_invalidate_grading_cache
+    BEFORE UPDATE ON assignment_questions
+    FOR EACH ROW EXECUTE FUNCTION invalidate_grading_cache();
+
+---------------------------- (12) Create per-user progress rollups  --------------------------
+-- one row per user per course, maintained by the app when grades are saved or a course is joined
+CREATE TABLE IF NOT EXISTS user_course_progress (
+    user_id VARCHAR(50) NOT NULL,
+    course_code VARCHAR(10) NOT NULL,
+    enrolled BOOLEAN NOT NULL DEFAULT FALSE,        -- user is enrolled in this course
+    completed_count INT NOT NULL DEFAULT 0,         -- graded assignments in this course's modules
+    total_count INT NOT NULL DEFAULT 0,             -- assignments in this course's modules
+    score_sum NUMERIC(10, 2) NOT NULL DEFAULT 0,    -- sum of grades.score where grades.course_code = course_code
+    max_sum NUMERIC(10, 2) NOT NULL DEFAULT 0,      -- sum of grades.max_score, same grouping
+    PRIMARY KEY (user_id, course_code),
+    FOREIGN KEY (user_id) REFERENCES student_information(user_id) ON DELETE CASCADE,
+    FOREIGN KEY (course_code) REFERENCES course_information(course_code) ON DELETE CASCADE
+);
+
+-- populate from existing data (same as: flask --app app rebuild-progress-rollups)
+INSERT INTO user_course_progress (user_id, course_code, enrolled, completed_count, total_count, score_sum, max_sum)
+WITH course_totals AS (
+    SELECT cm.course_code, COUNT(ca.assignment_id) AS total_count
+    FROM course_modules cm
+    LEFT JOIN course_assignments ca ON ca.module_id = cm.id
+    GROUP BY cm.course_code
+),
+completed AS (
+    SELECT g.user_id, cm.course_code, COUNT(*) AS completed_count
+    FROM grades g
+    JOIN course_assignments ca ON ca.assignment_id = g.assignment_id
+    JOIN course_modules cm ON ca.module_id = cm.id
+    WHERE g.score IS NOT NULL
+    GROUP BY g.user_id, cm.course_code
+),
+scored AS (
+    SELECT user_id, course_code, SUM(score) AS score_sum, SUM(max_score) AS max_sum
+    FROM grades
+    GROUP BY user_id, course_code
+),
+pairs AS (
+    SELECT user_id, course_code FROM enrollments
+    UNION
+    SELECT user_id, course_code FROM completed
+    UNION
+    SELECT user_id, course_code FROM scored
+)
+SELECT p.user_id, p.course_code,
+       EXISTS (SELECT 1 FROM enrollments e WHERE e.user_id = p.user_id AND e.course_code = p.course_code),
+       COALESCE(co.completed_count, 0), COALESCE(ct.total_count, 0),
+       COALESCE(sc.score_sum, 0), COALESCE(sc.max_sum, 0)
+FROM pairs p
+LEFT JOIN completed co ON co.user_id = p.user_id AND co.course_code = p.course_code
+LEFT JOIN scored sc ON sc.user_id = p.user_id AND sc.course_code = p.course_code
+LEFT JOIN course_totals ct ON ct.course_code = p.course_code;
+
+---------------------------- (13) Add session versions  --------------------------
+-- bumped by /change-password; signed session cookies carrying an older version are rejected at their next refresh
+ALTER TABLE student_information ADD COLUMN IF NOT EXISTS session_version INT NOT NULL DEFAULT 0;
@@ -1,83 +1,731 @@
-from flask import Flask, request, jsonify, make_response
+from flask import Blueprint, Flask, Response, after_this_request, current_app, request, jsonify, make_response, g, has_request_context
 from flask_cors import CORS
 import psycopg2
+import numpy as np
 from psycopg2.extras import RealDictCursor
+import psycopg2.extensions
+import psycopg2.pool
 import os
 from dotenv import load_dotenv
 from openai import OpenAI
 import logging
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, Range
+from qdrant_client.http.exceptions import UnexpectedResponse
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, Filter, FieldCondition, Range, MatchValue, OrderBy, Direction,
+    PointIdsList, PayloadSchemaType, KeywordIndexParams, KeywordIndexType
+)
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from prometheus_client import (
+    Counter, Histogram, CollectorRegistry, REGISTRY, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+)
 import time
 import json
 import re
+import threading
+import queue
+import uuid
+import atexit
+import hashlib
+import secrets
+import itertools
+import sqlite3
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+import contextvars
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
 
 # Load environment variables
 load_dotenv()
 
-# OpenAI client setup
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Configure logging 
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-# Allow requests from the frontend with credentials (for cookies)
-app = Flask(__name__)
+# Routes, hooks and CLI commands live on this blueprint; create_app() (bottom of file) builds the app
+bp = Blueprint("tutortech", __name__, cli_group=None)
+
+# ------------------------ Lazy Clients ------------------------
+# Importing this module makes no network calls, so gunicorn workers (and tests)
+# start without waiting on OpenAI or Qdrant. Each client is built on first use,
+# once per process: HTTP connection pools must not be shared across a fork.
+# The chat_history collection is provisioned by an explicit step instead:
+#   flask --app app migrate-qdrant     (deploys / local setup)
+#   gunicorn on_starting hook          (server/gunicorn.conf.py, once per master)
+# QDRANT_HOST=":memory:" runs an in-process instance (benchmarks); it starts
+# empty in every process, so it is bootstrapped when the client is built.
+# ----------------------------------------------------------------
+class LazyClient:
+    """Proxy that builds the wrapped client on first use, once per process."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    self._client = self._factory()
+                    self._pid = os.getpid()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+def make_openai_client():
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+
+def make_qdrant_client():
+    qdrant = QdrantClient(
+        location=os.getenv("QDRANT_HOST"),
+        api_key=os.getenv("QDRANT_API_KEY")
+    )
+    if os.getenv("QDRANT_HOST") == ":memory:":
+        bootstrap_qdrant(qdrant)
+    return qdrant
 
-# Enable CORS for the app (Hopefully this will fix cors issues)
-CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 
-# Configure logging 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+# OpenAI client setup
+client = LazyClient(make_openai_client)
 
 # Initialize Qdrant
-qdrant_client = QdrantClient(
-    url=os.getenv("QDRANT_HOST"),
-    api_key=os.getenv("QDRANT_API_KEY")
-)
+qdrant_client = LazyClient(make_qdrant_client)
 
-# Create a collection if it doesn't exist
 # 1536 is the size for OpenAI embeddings
 collection_name = "chat_history"
-if not qdrant_client.collection_exists(collection_name):
-    qdrant_client.create_collection(
-        collection_name=collection_name,
-        vectors_config=VectorParams(size=1536, distance=Distance.COSINE)
-    )
+
+# Payload indexes used by chat_history filters:
+#   user_id   -> keyword, tenant key (recent history, semantic search)
+#   role      -> keyword
+#   timestamp -> float (recent-history ordering, retention range deletes)
+CHAT_HISTORY_INDEXES = {
+    "user_id": KeywordIndexParams(type=KeywordIndexType.KEYWORD, is_tenant=True),
+    "role": PayloadSchemaType.KEYWORD,
+    "timestamp": PayloadSchemaType.FLOAT,
+}
+
+
+def bootstrap_qdrant(qdrant=None):
+    """Create the chat_history collection and any missing payload indexes; returns what was created."""
+    qdrant = qdrant or qdrant_client
+    created = []
+    if not qdrant.collection_exists(collection_name):
+        qdrant.create_collection(
+            collection_name=collection_name,
+            vectors_config=VectorParams(size=1536, distance=Distance.COSINE)
+        )
+        created.append(collection_name)
+
+    existing = qdrant.get_collection(collection_name).payload_schema
+    for field_name, field_schema in CHAT_HISTORY_INDEXES.items():
+        if field_name not in existing:
+            qdrant.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=field_schema,
+                wait=True
+            )
+            created.append(field_name)
+    if created:
+        logging.info(f"Created in Qdrant: {', '.join(created)}")
+    return created
+
+
+@bp.cli.command("migrate-qdrant")
+def migrate_qdrant_command():
+    """Create the chat_history collection and its payload indexes if they are missing."""
+    created = bootstrap_qdrant()
+    print(f"Created: {', '.join(created)}" if created else "chat_history collection and indexes already exist.")
+
+# ------------------------ Metrics ------------------------
+# Prometheus histograms/counters served on /metrics:
+#   tutortech_request_duration_seconds{route,method,status}
+#   tutortech_stage_duration_seconds{route,stage,model}  -> each external call
+#   tutortech_stage_errors_total{route,stage,model}
+# Stages: db_acquire, db_query, db_write, embedding, qdrant_scroll, qdrant_search,
+# qdrant_upsert, completion, grading.
+# With several gunicorn workers, point PROMETHEUS_MULTIPROC_DIR at an empty
+# directory (wiped before each start); every worker writes its samples there and
+# /metrics aggregates all of them. Only counters/histograms are used, so no
+# gunicorn child_exit hook is needed.
+# ---------------------------------------------------------
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REQUEST_LATENCY = Histogram(
+    "tutortech_request_duration_seconds", "Time to build the response for a route",
+    ["route", "method", "status"], buckets=METRICS_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    "tutortech_stage_duration_seconds", "Time spent in one external call",
+    ["route", "stage", "model"], buckets=METRICS_BUCKETS
+)
+STAGE_ERRORS = Counter(
+    "tutortech_stage_errors_total", "External calls that raised",
+    ["route", "stage", "model"]
+)
+
+# route label for stage timings; copied into worker threads by submit_in_route()
+metrics_route = contextvars.ContextVar("metrics_route", default="background")
+
+
+@contextmanager
+def timed_stage(stage, model=""):
+    """Time the enclosed external call under the current route."""
+    labels = (metrics_route.get(), stage, model)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(*labels).inc()
+        raise
+    finally:
+        STAGE_LATENCY.labels(*labels).observe(time.perf_counter() - start)
+
+
+def submit_in_route(executor, fn, *args):
+    """executor.submit(fn, *args), keeping the caller's route label for timings."""
+    route = metrics_route.get()
+
+    def run():
+        token = metrics_route.set(route)
+        try:
+            return fn(*args)
+        finally:
+            metrics_route.reset(token)
+
+    return executor.submit(run)
+
+
+def route_label():
+    """Endpoint name without the blueprint prefix, e.g. "chat"."""
+    return request.endpoint.rpartition(".")[2] if request.endpoint else "unknown"
+
+
+@bp.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics_route.set(route_label())
+
+
+@bp.after_app_request
+def record_request_latency(response):
+    started = g.pop("request_started", None)
+    if started is not None and route_label() != "metrics":
+        REQUEST_LATENCY.labels(
+            route_label(), request.method, str(response.status_code)
+        ).observe(time.perf_counter() - started)
+    return response
+
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+# ------------------------ PostgreSQL Connection Pool ------------------------
+# Every route borrows a connection through get_db_connection() and hands it back
+# with conn.close(). The pool keeps a bounded set of open connections per worker
+# process so requests skip the TCP/TLS/auth handshake against the hosted database.
+#   - DB_POOL_MAX: hard upper bound on open connections per worker
+#   - DB_POOL_TIMEOUT: seconds to wait for a free connection before giving up
+#   - DB_POOL_HEALTHCHECK_INTERVAL: idle seconds after which a borrowed
+#     connection is pinged with SELECT 1 before being handed out
+# ---------------------------------------------------------------------------
+class PooledConnection:
+    """Proxy around a pooled psycopg2 connection; close() returns it to the pool."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self):
+        # routes sometimes close twice (inside try and again in finally)
+        if not self._released:
+            self._released = True
+            self._pool.release(self._raw)
+
+
+class ConnectionPool:
+    """Thread-safe, bounded pool of psycopg2 connections with checkout timeouts."""
+
+    def __init__(self, maxconn, timeout, healthcheck_interval, **connect_kwargs):
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_interval = healthcheck_interval
+        self.connect_kwargs = connect_kwargs
+        self.pid = os.getpid()
+
+        self._lock = threading.Condition()
+        self._idle = []            # list of (connection, last_used) tuples
+        self._in_use = set()
+        self._opening = 0          # slots reserved by threads currently connecting
+        self._stats = {
+            "checkouts": 0,
+            "connections_opened": 0,
+            "connections_discarded": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "healthcheck_failures": 0,
+        }
+
+    def _is_healthy(self, connection, last_used):
+        if connection.closed:
+            return False
+        if connection.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if time.time() - last_used < self.healthcheck_interval:
+            return True
+        try:
+            with connection.cursor() as cur:
+                cur.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, connection):
+        self._stats["connections_discarded"] += 1
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def acquire(self):
+        start = time.time()
+        deadline = start + self.timeout
+        waited = False
+
+        while True:
+            candidate = None
+            with self._lock:
+                while True:
+                    # reuse the most recently returned idle connection first
+                    if self._idle:
+                        candidate, last_used = self._idle.pop()
+                        self._in_use.add(candidate)
+                        break
+
+                    # reserve a slot for a new connection if we are under the limit
+                    if len(self._in_use) + self._opening < self.maxconn:
+                        self._opening += 1
+                        break
+
+                    # otherwise wait for another request to release one
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise psycopg2.pool.PoolError(
+                            f"Timed out after {self.timeout}s waiting for a database connection"
+                        )
+                    waited = True
+                    self._lock.wait(remaining)
+
+            # network work (health check / connect) happens outside the lock
+            if candidate is not None:
+                if self._is_healthy(candidate, last_used):
+                    return self._checkout(candidate, start, waited)
+                with self._lock:
+                    self._in_use.discard(candidate)
+                    self._stats["healthcheck_failures"] += 1
+                    self._discard(candidate)
+                continue
+
+            try:
+                connection = psycopg2.connect(**self.connect_kwargs)
+            except psycopg2.Error:
+                with self._lock:
+                    self._opening -= 1
+                    self._lock.notify()
+                raise
+            logging.info("Successfully connected to the PostgreSQL database.")
+            with self._lock:
+                self._opening -= 1
+                self._in_use.add(connection)
+                self._stats["connections_opened"] += 1
+            return self._checkout(connection, start, waited)
+
+    def _checkout(self, connection, start, waited):
+        wait_time = time.time() - start
+        with self._lock:
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["waits"] += 1
+            self._stats["wait_time_total"] += wait_time
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], wait_time)
+        return connection
+
+    def release(self, connection):
+        # never hand out a connection with an open or failed transaction; the rollback
+        # is a network round trip, so it happens before taking the lock
+        reusable = not connection.closed
+        if reusable:
+            try:
+                if connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+            except psycopg2.Error:
+                reusable = False
+
+        with self._lock:
+            self._in_use.discard(connection)
+            if reusable and len(self._idle) < self.maxconn:
+                self._idle.append((connection, time.time()))
+                connection = None
+            elif not connection.closed:
+                self._stats["connections_discarded"] += 1
+            self._lock.notify()
+
+        if connection is not None and not connection.closed:
+            try:
+                connection.close()
+            except psycopg2.Error:
+                pass
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "pid": self.pid,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "max_size": self.maxconn,
+                "wait_time_avg": (
+                    stats["wait_time_total"] / stats["checkouts"] if stats["checkouts"] else 0.0
+                ),
+            })
+            return stats
+
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+_inherited_db_pools = []
+
+
+def _reset_db_pool_after_fork():
+    # A forked worker shares the parent's sockets. Keep the inherited pool
+    # referenced (closing or garbage-collecting it would terminate the parent's
+    # sessions) and let get_db_pool() build a fresh one for this process.
+    global _db_pool, _db_pool_lock
+    if _db_pool is not None:
+        _inherited_db_pools.append(_db_pool)
+    _db_pool = None
+    _db_pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_db_pool_after_fork)
+
+
+def get_db_pool():
+    global _db_pool
+    if _db_pool is not None and _db_pool.pid == os.getpid():
+        return _db_pool
+
+    with _db_pool_lock:
+        if _db_pool is None or _db_pool.pid != os.getpid():
+            _db_pool = ConnectionPool(
+                maxconn=int(os.getenv("DB_POOL_MAX", 10)),
+                timeout=float(os.getenv("DB_POOL_TIMEOUT", 10)),
+                healthcheck_interval=float(os.getenv("DB_POOL_HEALTHCHECK_INTERVAL", 30)),
+                host=os.getenv("DB_HOST"),
+                database=os.getenv("DB_NAME"),
+                user=os.getenv("DB_USER"),
+                password=os.getenv("DB_PASSWORD"),
+                port=os.getenv("DB_PORT"),
+                cursor_factory=RealDictCursor
+            )
+    return _db_pool
+
 
 def get_db_connection():
     try:
-        connection = psycopg2.connect(
-            host=os.getenv("DB_HOST"),
-            database=os.getenv("DB_NAME"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            port=os.getenv("DB_PORT"),
-            cursor_factory=RealDictCursor
-        )
-        logging.info("Successfully connected to the PostgreSQL database.")
+        pool = get_db_pool()
+        with timed_stage("db_acquire"):
+            raw = pool.acquire()
+        connection = PooledConnection(pool, raw)
+
+        # remember the checkout so teardown can return it if a route forgets to close
+        if has_request_context():
+            g.setdefault("db_connections", []).append(connection)
         return connection
     except psycopg2.Error as e:
         logging.error(f"Failed to connect to the PostgreSQL database: {e}")
         raise
 
+
+@bp.teardown_app_request
+def release_db_connections(exc):
+    for connection in g.pop("db_connections", []):
+        connection.close()
+
+# ------------------------ Embedding Cache ------------------------
+# Embeddings are content-addressed by sha256(model, normalized text), so repeated
+# prompts ("explain again", the Explain-button prompt) skip the OpenAI round trip.
+#   - memory tier: per-process LRU of EMBEDDING_CACHE_SIZE vectors
+#   - disk tier (optional): SQLite file at EMBEDDING_CACHE_PATH, survives restarts
+#     and is shared by every gunicorn worker on the host
+# -----------------------------------------------------------------
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+
+class EmbeddingCache:
+    """Two-tier (memory LRU + optional SQLite) cache of embedding vectors."""
+
+    def __init__(self, max_size, path=None):
+        self.max_size = max_size
+        self.path = path
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "disk_errors": 0}
+
+    @staticmethod
+    def make_key(model, text):
+        normalized = " ".join(text.split())
+        return hashlib.sha256(f"{model}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def _disk(self):
+        # one SQLite connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return vector
+
+        if self.path:
+            try:
+                row = self._disk().execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                logging.warning(f"Embedding cache read failed: {e}")
+                row = None
+                with self._lock:
+                    self._stats["disk_errors"] += 1
+            if row:
+                vector = array("d", row[0]).tolist()
+                self._remember(key, vector)
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+                return vector
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, key, vector):
+        self._remember(key, vector)
+        if self.path:
+            try:
+                conn = self._disk()
+                conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    (key, array("d", vector).tobytes())
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logging.warning(f"Embedding cache write failed: {e}")
+                with self._lock:
+                    self._stats["disk_errors"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_size"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+embedding_cache = EmbeddingCache(
+    max_size=int(os.getenv("EMBEDDING_CACHE_SIZE", 2048)),
+    path=os.getenv("EMBEDDING_CACHE_PATH")
+)
+
+
 def embed_text(text):
-    """Generate an embedding using OpenAI (for Qdrant)."""
-    response = client.embeddings.create(model="text-embedding-ada-002", input=[text])
-    return response.data[0].embedding
+    """Generate an embedding using OpenAI (for Qdrant), served from the cache when possible."""
+    key = EmbeddingCache.make_key(EMBEDDING_MODEL, text)
+    embedding = embedding_cache.get(key)
+    if embedding is not None:
+        return embedding
+
+    with timed_stage("embedding", EMBEDDING_MODEL):
+        response = client.embeddings.create(model=EMBEDDING_MODEL, input=[text])
+    embedding = response.data[0].embedding
+    embedding_cache.put(key, embedding)
+    return embedding
+
+
+def embed_texts(texts):
+    """Embed many texts with at most one OpenAI call; cached texts are not re-sent."""
+    keys = [EmbeddingCache.make_key(EMBEDDING_MODEL, text) for text in texts]
+    embeddings = [embedding_cache.get(key) for key in keys]
+
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        with timed_stage("embedding", EMBEDDING_MODEL):
+            response = client.embeddings.create(model=EMBEDDING_MODEL, input=[texts[i] for i in missing])
+        for i, item in zip(missing, sorted(response.data, key=lambda item: item.index)):
+            embeddings[i] = item.embedding
+            embedding_cache.put(keys[i], item.embedding)
+    return embeddings
+
+# ------------------------ Chat History Retention ------------------------
+# Messages older than CHAT_RETENTION_DAYS are deleted from chat_history in batches
+# of CHAT_RETENTION_BATCH_SIZE points, using the payload index on timestamp so the
+# range filter does not scan the collection (see bootstrap_qdrant).
+#   - In-process: set CHAT_RETENTION_SCHEDULER=1 and every CHAT_RETENTION_INTERVAL
+#     seconds the worker holding CHAT_RETENTION_LOCK_FILE (an flock, so exactly one
+#     gunicorn worker per host) runs a sweep. If that worker exits, another takes over.
+#   - Cron: flask --app app sweep-chat-history
+# -------------------------------------------------------------------------
+CHAT_RETENTION_DAYS = float(os.getenv("CHAT_RETENTION_DAYS", 30))
+CHAT_RETENTION_BATCH_SIZE = int(os.getenv("CHAT_RETENTION_BATCH_SIZE", 500))
+CHAT_RETENTION_INTERVAL = float(os.getenv("CHAT_RETENTION_INTERVAL", 6 * 60 * 60))
+CHAT_RETENTION_LOCK_FILE = os.getenv("CHAT_RETENTION_LOCK_FILE", "/tmp/tutortech-retention.lock")
+
+
+def sweep_expired_messages(max_age_days=CHAT_RETENTION_DAYS, batch_size=CHAT_RETENTION_BATCH_SIZE):
+    """Delete chat_history points older than max_age_days in bounded batches."""
+    start = time.time()
+    threshold_time = start - (max_age_days * 24 * 60 * 60)
+    expired = Filter(must=[FieldCondition(key="timestamp", range=Range(lt=threshold_time))])
+
+    deleted = 0
+    batches = 0
+    while True:
+        points, _ = qdrant_client.scroll(
+            collection_name=collection_name,
+            scroll_filter=expired,
+            limit=batch_size,
+            with_payload=False,
+            with_vectors=False
+        )
+        if not points:
+            break
+        qdrant_client.delete(
+            collection_name=collection_name,
+            points_selector=PointIdsList(points=[point.id for point in points]),
+            wait=True
+        )
+        deleted += len(points)
+        batches += 1
+
+    report = {"deleted": deleted, "batches": batches, "duration": round(time.time() - start, 3)}
+    logging.info(f"Chat history retention sweep: {report}")
+    return report
+
 
 # Delete messages older than 30 days
 def delete_old_messages():
-    threshold_time = time.time() - (30 * 24 * 60 * 60)  # 30 days ago
-    qdrant_client.delete(
-            collection_name=collection_name,
-            points_selector=Filter(
-                must=[
-                    FieldCondition(
-                        key="timestamp",
-                        range=Range(lt=threshold_time)
-                    )
-                ]
-            )
-        )
-        
+    return sweep_expired_messages(max_age_days=30)
+
+
+class RetentionScheduler:
+    """Background thread that runs retention sweeps in the worker holding the leader lock."""
+
+    def __init__(self, interval, lock_path):
+        self.interval = interval
+        self.lock_path = lock_path
+        self._thread = None
+        self._pid = None
+        self._lock_file = None
+        self._start_lock = threading.Lock()
+
+    def _try_become_leader(self):
+        if self._lock_file is not None:
+            return True
+        if fcntl is None:
+            return True   # no flock (Windows dev machine): single process, always leader
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file   # held until this process exits
+        logging.info(f"Worker {os.getpid()} is the chat history retention leader.")
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                if self._try_become_leader():
+                    sweep_expired_messages()
+            except Exception as e:
+                logging.error(f"Chat history retention sweep failed: {e}")
+            time.sleep(self.interval)
+
+    def release_inherited_lock(self):
+        # A forked child shares the parent's locked file description; its copy of
+        # the descriptor would keep the flock held after the parent exits. Closing
+        # it does not unlock the parent, whose own descriptor still holds it.
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="chat-retention", daemon=True)
+                self._thread.start()
+
+
+retention_scheduler = RetentionScheduler(CHAT_RETENTION_INTERVAL, CHAT_RETENTION_LOCK_FILE)
+os.register_at_fork(after_in_child=retention_scheduler.release_inherited_lock)
+
+
+@bp.before_app_request
+def start_background_jobs():
+    if os.getenv("CHAT_RETENTION_SCHEDULER") == "1":
+        retention_scheduler.ensure_started()
+
+
+@bp.cli.command("sweep-chat-history")
+def sweep_chat_history_command():
+    """Delete expired chat_history points once (for cron)."""
+    report = sweep_expired_messages()
+    print(f"Deleted {report['deleted']} points in {report['batches']} batches ({report['duration']}s).")
+
 def generate_prompt_from_preferences(prefs):
     if not prefs:
         return (
@@ -123,34 +771,69 @@ def generate_prompt_from_preferences(prefs):
     return " ".join(prompt_parts)
 
 
+# ------------------------ Custom Bot System Prompts ------------------------
+# The Custom bot's system prompt depends only on three preference choices, so
+# every combination (plus "no preferences saved") is compiled once at import.
+# Per user, only the combination key is cached, as the "preferences" claim of the
+# signed session cookie (see Session Tokens), so every worker sees the same value
+# and a Custom-bot turn does no DB query, JSON parsing or string building.
+#   - /save-preferences re-issues the caller's cookie, so their next turn uses the
+#     new prompt on any worker; their other devices follow on the next session
+#     refresh (at most SESSION_REFRESH_AFTER seconds)
+#   - requests without a fresh session cookie for the user load the preferences
+#     from Postgres, as before
+# ---------------------------------------------------------------------------
+PREFERENCE_OPTIONS = {
+    "response_length": (None, "short", "long"),
+    "guidance_style": (None, "step_by_step", "real_world"),
+    "value_focus": (None, "process", "direct"),
+}
+
+
+def parse_preferences(raw):
+    """Saved learning_preferences as a dict; {} when missing or not a JSON object."""
+    if not raw:
+        return {}
+    try:
+        preferences = json.loads(raw)
+    except (json.JSONDecodeError, TypeError):
+        return {}
+    return preferences if isinstance(preferences, dict) else {}
+
+
+def preference_key(prefs):
+    """Lookup-table key for saved preferences; None when nothing is saved."""
+    if not prefs:
+        return None
+    return tuple(
+        prefs.get(field) if prefs.get(field) in options else None
+        for field, options in PREFERENCE_OPTIONS.items()
+    )
+
+
+CUSTOM_SYSTEM_PROMPTS = {
+    key: generate_prompt_from_preferences(dict(zip(PREFERENCE_OPTIONS, key)))
+    for key in itertools.product(*PREFERENCE_OPTIONS.values())
+}
+CUSTOM_SYSTEM_PROMPTS[None] = generate_prompt_from_preferences({})
+
+
 # Merging semantic and recent searches for better responses
-def merge_histories(semantic, recent, current_prompt_embedding, qdrant_client):
-    
+def merge_histories(semantic, recent, current_prompt_embedding):
+
     #Prioritize recent messages. Fallback to semantic matches if recent is not helpful.
-    #Google to the rescue...?
-    def is_relevant(msg_embedding):
-        # Cosine similarity between embeddings
-        dot = sum(a * b for a, b in zip(current_prompt_embedding, msg_embedding))
-        norm_a = sum(a * a for a in current_prompt_embedding) ** 0.5
-        norm_b = sum(b * b for b in msg_embedding) ** 0.5
-        return dot / (norm_a * norm_b + 1e-8) >= 0.75
-
-    # Filter recent messages by semantic relevance
+    # Recent messages carry the vectors fetched by the initial scroll, so relevance
+    # is one cosine-similarity matrix-vector product instead of a Qdrant call each.
+    scored = [msg for msg in recent if msg.get("vector") is not None]
     filtered_recent = []
-    for msg in recent:
-        vector_result = qdrant_client.search(
-            collection_name="chat_history",
-            query_vector=current_prompt_embedding,
-            limit=1,
-            query_filter={"must": [{"key": "content", "match": {"value": msg["content"]}}]},
-            with_payload=False,
-            with_vectors=True
-        )
-
-        if vector_result:
-            recent_embedding = vector_result[0].vector
-            if is_relevant(recent_embedding):
-                filtered_recent.append(msg)
+    if scored:
+        matrix = np.asarray([msg["vector"] for msg in scored], dtype=np.float32)
+        query = np.asarray(current_prompt_embedding, dtype=np.float32)
+        similarity = (matrix @ query) / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-8)
+        filtered_recent = [
+            {"role": msg["role"], "content": msg["content"]}
+            for msg, score in zip(scored, similarity) if score >= 0.75
+        ]
 
     # If recent context isn't enough include semantic history
     seen = set()
@@ -179,51 +862,180 @@ def is_vague_prompt(prompt):
     return any(kw in lowered for kw in vague_keywords)
 
 # ------------------------ Detect Personal Information ------------------------ #
+# All categories are compiled into one alternation so a prompt is scanned once;
+# when several match at the same position the more specific category is reported.
+# Each pattern matches only the minimal prefix that proves a match, and every
+# repeated run is followed by a token it cannot contain (a digit after [ -]*, \s
+# after \w+), so backtracking into a run fails at once and the scan stays linear
+# on multi-kilobyte pastes (plain greedy quantifiers; no Python 3.11+ syntax).
+# Detection results are the same as the original per-category patterns:
+#   email        [A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}
+#   phone        \(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}
+#   address      \d{1,5}\s+\w+(\s\w+){1,5}
+#   zip          \b\d{5}(-\d{4})?\b
+#   ssn          \b\d{3}-\d{2}-\d{4}\b
+#   credit_card  \b(?:\d[ -]*?){13,16}\b
+# See bench/pii_benchmark.py for timings on realistic and adversarial prompts.
+# ------------------------------------------------------------------------------ #
+PII_PATTERN = re.compile(
+    # one local-part character is enough to prove an address exists
+    r"(?P<email>[A-Za-z0-9._%+-]@[A-Za-z0-9.-]+?\.[A-Za-z]{2})"
+    r"|(?P<ssn>\b\d{3}-\d{2}-\d{4}\b)"
+    # 13-16 digits, optionally separated by spaces or hyphens
+    r"|(?P<credit_card>\b\d(?:[ -]*\d){12,15}\b)"
+    r"|(?P<phone>\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4})"
+    r"|(?P<zip>\b\d{5}(?:-\d{4})?\b)"
+    # number, whitespace, then at least two words
+    r"|(?P<address>\d{1,5}\s+\w+\s\w)"
+)
+
+
+def detect_personal_info(text):
+    """Return the category of the first personal information found in text, or None."""
+    match = PII_PATTERN.search(text)
+    return match.lastgroup if match else None
+
 
 def contains_personal_info(text):
     """Detect if a user input contains potential personal information."""
-    # Patterns to match common personal information
-    email_pattern = r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}"
-    phone_pattern = r"\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}"
-    address_pattern = r"\d{1,5}\s+\w+(\s\w+){1,5}"
-    zip_pattern = r"\b\d{5}(-\d{4})?\b"
-    ssn_pattern = r"\b\d{3}-\d{2}-\d{4}\b"
-    credit_card_pattern = r"\b(?:\d[ -]*?){13,16}\b"
-
-    patterns = [
-        email_pattern,
-        phone_pattern,
-        address_pattern,
-        zip_pattern,
-        ssn_pattern,
-        credit_card_pattern
-    ]
-
-    for pattern in patterns:
-        if re.search(pattern, text):
-            return True
-    return False
+    return detect_personal_info(text) is not None
 
 
 # Check hosted DB connection via Ping
-@app.route("/ping")
+@bp.route("/ping")
 def ping():
     try:
-        conn = psycopg2.connect(
-            host=os.getenv('DB_HOST'),
-            dbname=os.getenv('DB_NAME'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            port=os.getenv('DB_PORT', 5432)
-        )
+        conn = get_db_connection()
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
         conn.close()
-        return {"message": "DB connection successful"}
+        return {"message": "DB connection successful", "pool": get_db_pool().stats()}
     except Exception as e:
         return {"error": str(e)}, 500
 
 
+# Connection pool statistics for monitoring
+@bp.route("/pool-stats")
+def pool_stats():
+    return jsonify(get_db_pool().stats()), 200
+
+
+# Embedding cache hit/miss counters for monitoring
+@bp.route("/embedding-cache-stats")
+def embedding_cache_stats():
+    return jsonify(embedding_cache.stats()), 200
+
+
+# -------------------------------- Session Tokens --------------------------------
+# Login sets a signed, timestamped session cookie carrying what /session returns
+# (name, email, history_enabled), the Custom bot preference key and the user's
+# session_version, so /session and Custom-bot chat turns normally answer without
+# touching Postgres. Once a cookie was signed more than SESSION_REFRESH_AFTER
+# seconds ago, the next lookup re-reads the row and re-issues it.
+# Scope of the time-based staleness:
+#   - /update-profile, /update-history-setting and /save-preferences re-issue the
+#     caller's cookie; the user's other tabs/devices keep the old claims until
+#     their next refresh, i.e. for at most SESSION_REFRESH_AFTER seconds
+#   - /change-password bumps student_information.session_version; a cookie with an
+#     older version is rejected (logged out) at its next refresh, so other devices
+#     lose access within SESSION_REFRESH_AFTER seconds, not SESSION_MAX_AGE
+#   - SECRET_KEY: signing key; every worker and restart must share it. Required
+#     unless running in debug mode (FLASK_DEBUG=1 or `python app.py`)
+#   - SESSION_MAX_AGE: seconds until the user has to log in again
+#   - SESSION_REFRESH_AFTER: seconds a cookie's claims are trusted without the database
+# ---------------------------------------------------------------------------------
+SESSION_COOKIE = "session_token"
+SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", 7 * 24 * 3600))
+SESSION_REFRESH_AFTER = int(os.getenv("SESSION_REFRESH_AFTER", 300))
+
+SECRET_KEY = os.getenv("SECRET_KEY")
+if not SECRET_KEY:
+    # a per-process random key would log everyone out on each restart and make
+    # workers reject each other's cookies, so only debug runs may go without one
+    if os.getenv("FLASK_DEBUG") != "1" and __name__ != "__main__":
+        raise RuntimeError("SECRET_KEY is not set; it signs session cookies and must be shared by every worker.")
+    logging.warning("SECRET_KEY is not set; debug sessions are signed with a random per-start key.")
+    SECRET_KEY = secrets.token_hex(32)
+
+session_serializer = URLSafeTimedSerializer(SECRET_KEY, salt="tutortech-session")
+
+
+def session_claims(user_info):
+    """Cookie claims from a student_information row (incl. learning_preferences)."""
+    # a malformed stored value must not lock the user out; it just means no preferences
+    preferences = parse_preferences(user_info["learning_preferences"])
+    return {
+        "user_id": user_info["user_id"],
+        "first_name": user_info["first_name"],
+        "last_name": user_info["last_name"],
+        "email": user_info["email"],
+        "history_enabled": user_info["history_enabled"],
+        "preferences": preference_key(preferences),
+        "session_version": user_info["session_version"],
+    }
+
+
+def load_session_claims(cursor, user_id):
+    cursor.execute(
+        "SELECT user_id, first_name, last_name, email, history_enabled, learning_preferences, session_version FROM student_information WHERE user_id = %s",
+        (user_id,)
+    )
+    user_info = cursor.fetchone()
+    return session_claims(user_info) if user_info else None
+
+
+def session_response_body(claims):
+    return {
+        "user_id": claims["user_id"],
+        "first_name": claims["first_name"],
+        "last_name": claims["last_name"],
+        "email": claims["email"],
+        "history_enabled": claims.get("history_enabled", True),
+    }
+
+
+def set_session_cookie(response, claims):
+    response.set_cookie(
+        SESSION_COOKIE, session_serializer.dumps(claims),
+        max_age=SESSION_MAX_AGE, httponly=True, samesite='None', secure=True
+    )
+
+
+def read_session_cookie():
+    """(claims, signed_at) from a valid session cookie, or (None, None)."""
+    token = request.cookies.get(SESSION_COOKIE)
+    if not token:
+        return None, None
+    try:
+        return session_serializer.loads(token, max_age=SESSION_MAX_AGE, return_timestamp=True)
+    except BadSignature:   # also covers expired tokens
+        return None, None
+
+
+def session_claims_stale(signed_at):
+    return time.time() - signed_at.timestamp() > SESSION_REFRESH_AFTER
+
+
+def session_revoked(claims, current):
+    """True when a password change has bumped the user's session_version since claims were signed."""
+    return claims.get("session_version", 0) != current["session_version"]
+
+
+def reissue_session_cookie(response, user_info, signed_version=None):
+    """Re-issue the caller's cookie from an updated row, if it is a live session for that user.
+
+    signed_version is the session_version the caller's cookie must carry; it
+    defaults to the row's own (routes that bump the version pass the old one).
+    """
+    claims, _ = read_session_cookie()
+    if signed_version is None:
+        signed_version = user_info["session_version"]
+    if claims and claims["user_id"] == user_info["user_id"] and claims.get("session_version", 0) == signed_version:
+        set_session_cookie(response, session_claims(user_info))
+
+
 # -------------------------------- User Login --------------------------------
-@app.route('/login', methods=['POST'])
+@bp.route('/login', methods=['POST'])
 def login():
 
     data = request.json  
@@ -243,21 +1055,17 @@ def login():
         if not result:
             return jsonify({"message": "Invalid username or password"}), 401
 
-        cursor.execute(
-            "SELECT first_name, last_name, email FROM student_information WHERE user_id = %s",
-            (user_id,)
-        )
-        user_info = cursor.fetchone()
+        claims = load_session_claims(cursor, user_id)
 
-        if user_info:
+        if claims:
             response = make_response(jsonify({
                 "message": "Login successful",
                 "user_id": user_id,
-                "email": user_info["email"],
-                "first_name": user_info["first_name"],
-                "last_name": user_info["last_name"]
+                "email": claims["email"],
+                "first_name": claims["first_name"],
+                "last_name": claims["last_name"]
             }))
-            response.set_cookie("user_id", user_id, httponly=True, samesite='None', secure=True)
+            set_session_cookie(response, claims)
             return response, 200
         else:
             return jsonify({"message": "User information not found"}), 404
@@ -271,7 +1079,7 @@ def login():
             conn.close()
 
 # -------------------------------- User Sign up --------------------------------
-@app.route('/signup', methods=['POST'])
+@bp.route('/signup', methods=['POST'])
 def signup():
     data = request.json
     user_id = data.get("user_id")
@@ -309,31 +1117,30 @@ def signup():
             conn.close()
 
 # -------------------------------- Check Session --------------------------------
-@app.route('/session', methods=['GET'])
+@bp.route('/session', methods=['GET'])
 def session():
-    user_id = request.cookies.get('user_id')
-    if not user_id:
+    claims, signed_at = read_session_cookie()
+    if not claims:
         return jsonify({"message": "No active session"}), 401
 
+    # Fresh claims are answered straight from the signed cookie
+    if not session_claims_stale(signed_at):
+        return jsonify({**session_response_body(claims), "message": "Session active"}), 200
+
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-
-        cursor.execute(
-            "SELECT user_id, first_name, last_name, email, history_enabled FROM student_information WHERE user_id = %s",
-            (user_id,)
-        )
-        user_info = cursor.fetchone()
-
-        if user_info:
-            return jsonify({
-                "user_id": user_info["user_id"],
-                "first_name": user_info["first_name"],
-                "last_name": user_info["last_name"],
-                "email": user_info["email"],
-                "history_enabled": user_info.get("history_enabled", True),
-                "message": "Session active"
-            }), 200
+        current = load_session_claims(cursor, claims["user_id"])
+
+        if current and session_revoked(claims, current):
+            response = make_response(jsonify({"message": "Session expired, please log in again"}))
+            response.delete_cookie(SESSION_COOKIE, httponly=True, samesite='None', secure=True)
+            return response, 401
+        if current:
+            response = make_response(jsonify({**session_response_body(current), "message": "Session active"}))
+            set_session_cookie(response, current)
+            return response, 200
         else:
             return jsonify({"message": "User information not found"}), 404
 
@@ -346,15 +1153,16 @@ def session():
             conn.close()
 
 # -------------------------------- Logout --------------------------------
-@app.route('/logout', methods=['POST'])
+@bp.route('/logout', methods=['POST'])
 def logout():
     response = make_response(jsonify({"message": "Logged out"}))
-    response.delete_cookie("user_id")
+    response.delete_cookie(SESSION_COOKIE, httponly=True, samesite='None', secure=True)
+    response.delete_cookie("user_id")   # cookie set by logins before signed sessions
     return response, 200
 
 
 # -------------------------------- Update Profile --------------------------------
-@app.route('/update-profile', methods=['PUT'])
+@bp.route('/update-profile', methods=['PUT'])
 def update_profile():
 
     data = request.json  
@@ -366,9 +1174,12 @@ def update_profile():
     try:
         conn= get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("UPDATE student_information SET first_name = %s, last_name = %s, email=%s WHERE user_id = %s RETURNING user_id, first_name, last_name, email",
-            (first_name, last_name, email, user_id)
-        )
+        cursor.execute("""
+            UPDATE student_information
+            SET first_name = %s, last_name = %s, email = %s
+            WHERE user_id = %s
+            RETURNING user_id, first_name, last_name, email, history_enabled, learning_preferences, session_version
+        """, (first_name, last_name, email, user_id))
         user_info = cursor.fetchone()
 
         conn.commit()
@@ -376,12 +1187,15 @@ def update_profile():
         conn.close()
 
         if user_info:
-            return jsonify({
+            # this session gets fresh claims; others catch up on their next refresh
+            response = make_response(jsonify({
                 "user_id": user_id,
                 "first_name": user_info["first_name"],
                 "last_name": user_info["last_name"],
                 "email": user_info["email"],
-            })
+            }))
+            reissue_session_cookie(response, user_info)
+            return response
         else:
             return jsonify({"message": "Failed to update profile"}), 500
 
@@ -390,7 +1204,7 @@ def update_profile():
         return jsonify({"message": "Server error"}), 500
     
 # -------------------------------- Change Password --------------------------------
-@app.route('/change-password', methods=["PUT"])
+@bp.route('/change-password', methods=["PUT"])
 def change_password():
     
     data = request.json
@@ -411,12 +1225,22 @@ def change_password():
         if not result:
             return jsonify({"message": "Current Password Invalid"}), 401
         
-        cursor.execute("UPDATE student_information SET user_password = %s WHERE user_id = %s", (newPassword, user_id))
+        # bumping session_version revokes every other session at its next refresh
+        cursor.execute("""
+            UPDATE student_information
+            SET user_password = %s, session_version = session_version + 1
+            WHERE user_id = %s
+            RETURNING user_id, first_name, last_name, email, history_enabled, learning_preferences, session_version
+        """, (newPassword, user_id))
+        user_info = cursor.fetchone()
         conn.commit()
         cursor.close()
         conn.close()
-        
-        return jsonify({"message": "Password updated successfully."})
+
+        # the device that changed the password stays logged in
+        response = make_response(jsonify({"message": "Password updated successfully."}))
+        reissue_session_cookie(response, user_info, signed_version=user_info["session_version"] - 1)
+        return response
     
     except Exception as e:
         print("Error updating password:", e)
@@ -424,9 +1248,145 @@ def change_password():
         
 
 
+# ------------------------- Course Catalog Cache --------------------------------
+# Course, module, lecture and assignment listings change only when instructors edit
+# a course, so their JSON bodies are cached per worker for CATALOG_CACHE_TTL seconds
+# (LRU, at most CATALOG_CACHE_SIZE bodies, since keys come from request paths).
+# Responses carry an ETag (hash of the body); a matching If-None-Match is answered
+# with 304 straight from the cache, without touching the database.
+# Invalidation: catalog_cache.invalidate() in-process, or
+#   flask --app app invalidate-catalog-cache
+# which touches CATALOG_CACHE_VERSION_FILE (when set) so every worker sharing
+# that file drops its entries on the next request. A body queried before an
+# invalidation is served but not stored.
+# ---------------------------------------------------------------------------------
+class CatalogCache:
+    """Versioned in-process LRU cache of catalog response bodies with TTL."""
+
+    def __init__(self, ttl, max_entries, version_path=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version_path = version_path
+        self._entries = OrderedDict()   # key -> (expires_at, body, etag), least recently used first
+        self._lock = threading.Lock()
+        self._generation = 0            # bumped whenever the entries are dropped
+        self._version_stamp = self._read_version_stamp()
+        self._stats = {"hits": 0, "misses": 0, "not_modified": 0, "invalidations": 0}
+
+    def _read_version_stamp(self):
+        if not self.version_path:
+            return None
+        try:
+            return os.stat(self.version_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _check_shared_version(self):
+        # another process bumped the shared version file: drop everything we hold
+        stamp = self._read_version_stamp()
+        if stamp != self._version_stamp:
+            self._version_stamp = stamp
+            self._entries.clear()
+            self._generation += 1
+
+    def get(self, key):
+        """Return (entry or None, generation); pass the generation to put() after a miss."""
+        with self._lock:
+            self._check_shared_version()
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.time():
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry, self._generation
+            self._entries.pop(key, None)
+            self._stats["misses"] += 1
+            return None, self._generation
+
+    def put(self, key, body, generation):
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        entry = (time.time() + self.ttl, body, etag)
+        with self._lock:
+            self._check_shared_version()
+            # the body was queried before an invalidation: serve it, but don't keep it
+            if generation != self._generation:
+                return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def record_not_modified(self):
+        with self._lock:
+            self._stats["not_modified"] += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self._stats["invalidations"] += 1
+            if self.version_path:
+                with open(self.version_path, "a"):
+                    os.utime(self.version_path, None)
+                self._version_stamp = self._read_version_stamp()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            return stats
+
+
+catalog_cache = CatalogCache(
+    ttl=float(os.getenv("CATALOG_CACHE_TTL", 300)),
+    max_entries=int(os.getenv("CATALOG_CACHE_SIZE", 1000)),
+    version_path=os.getenv("CATALOG_CACHE_VERSION_FILE")
+)
+
+
+def catalog_entry_response(entry):
+    _, body, etag = entry
+    if request.if_none_match.contains(etag):
+        catalog_cache.record_not_modified()
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"   # browsers revalidate with If-None-Match
+    return response
+
+
+def cached_catalog_response(key):
+    """Serve a cached catalog body (or 304) if present, otherwise return None."""
+    entry, g.catalog_generation = catalog_cache.get(key)
+    return catalog_entry_response(entry) if entry else None
+
+
+def store_catalog_response(key, data):
+    """Cache a freshly queried catalog payload and build its response."""
+    body = current_app.json.dumps(data).encode("utf-8")
+    return catalog_entry_response(catalog_cache.put(key, body, g.catalog_generation))
+
+
+@bp.cli.command("invalidate-catalog-cache")
+def invalidate_catalog_cache_command():
+    """Drop cached catalog responses (all workers when CATALOG_CACHE_VERSION_FILE is set)."""
+    catalog_cache.invalidate()
+    print("Catalog cache invalidated.")
+
+
+@bp.route("/catalog-cache-stats")
+def catalog_cache_stats():
+    return jsonify(catalog_cache.stats()), 200
+
+
 # ------------------------- Fetch Course Information --------------------------------
-@app.route('/courses', methods=['GET'])
+@bp.route('/courses', methods=['GET'])
 def get_courses():
+    cached = cached_catalog_response("courses")
+    if cached:
+        return cached
+
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -434,7 +1394,7 @@ def get_courses():
         courses = cursor.fetchall()
 
         # Return fetched courses as JSON
-        return jsonify(courses), 200
+        return store_catalog_response("courses", courses)
 
     except Exception as e:
         return jsonify({"message": "Server error"}), 500
@@ -443,8 +1403,12 @@ def get_courses():
         if conn:
             conn.close()
 
-@app.route('/courses/<course_id>', methods=['GET'])
+@bp.route('/courses/<course_id>', methods=['GET'])
 def get_course(course_id):
+    cached = cached_catalog_response(f"course:{course_id}")
+    if cached:
+        return cached
+
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -477,14 +1441,14 @@ def get_course(course_id):
         """, (course_id,))
         assignments = cursor.fetchall()
 
-        return jsonify({
+        return store_catalog_response(f"course:{course_id}", {
             "course_code": course["course_code"],
             "course_title": course["course_title"],
             "credits": course["credits"],
             "course_description": course["course_description"],
             "lectures": lectures,
             "assignments": assignments
-        }), 200
+        })
 
 
     except Exception as e:
@@ -505,8 +1469,12 @@ def get_course(course_id):
 #   - Fetch all modules for a given course using its course_code
 #   - Returns a list of module metadata (id, title, sequence, description)
 # -------------------------------------------------------------------------
-@app.route('/courses/<course_code>/modules', methods=['GET'])
+@bp.route('/courses/<course_code>/modules', methods=['GET'])
 def get_modules(course_code):
+    cached = cached_catalog_response(f"modules:{course_code}")
+    if cached:
+        return cached
+
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -520,7 +1488,7 @@ def get_modules(course_code):
         """, (course_code,))
         modules = cursor.fetchall()        # retrieve query results
 
-        return jsonify(modules), 200       # return modules as JSON with 200 OK
+        return store_catalog_response(f"modules:{course_code}", modules)   # return modules as JSON with 200 OK
 
     except Exception as e:
         print(f"Error fetching modules: {e}")
@@ -540,8 +1508,12 @@ def get_modules(course_code):
 #   - Retrieve all lecture items for a given module ID
 #   - Each lecture includes its title and YouTube video link
 # --------------------------------------------------------------------------
-@app.route('/modules/<int:module_id>/lectures', methods=['GET'])
+@bp.route('/modules/<int:module_id>/lectures', methods=['GET'])
 def get_module_lectures(module_id):
+    cached = cached_catalog_response(f"lectures:{module_id}")
+    if cached:
+        return cached
+
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -555,7 +1527,7 @@ def get_module_lectures(module_id):
         """, (module_id,))
         lectures = cursor.fetchall()
 
-        return jsonify(lectures), 200
+        return store_catalog_response(f"lectures:{module_id}", lectures)
 
     except Exception as e:
         print(f"Error fetching module lectures: {e}")
@@ -575,8 +1547,12 @@ def get_module_lectures(module_id):
 #   - Return all assignments for a specific module
 #   - Each assignment includes its title and max score
 # ------------------------------------------------------------------------
-@app.route('/modules/<int:module_id>/assignments', methods=['GET'])
+@bp.route('/modules/<int:module_id>/assignments', methods=['GET'])
 def get_module_assignments(module_id):
+    cached = cached_catalog_response(f"assignments:{module_id}")
+    if cached:
+        return cached
+
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -590,7 +1566,7 @@ def get_module_assignments(module_id):
         """, (module_id,))
         assignments = cursor.fetchall()
 
-        return jsonify(assignments), 200
+        return store_catalog_response(f"assignments:{module_id}", assignments)
 
     except Exception as e:
         print(f"Error fetching module assignments: {e}")
@@ -610,61 +1586,39 @@ def get_module_assignments(module_id):
 #       • A module is unlocked only if all assignments from the previous module are completed
 #   - Used to restrict access to content based on sequential progression
 # -----------------------------------------------------------------------
-@app.route('/courses/<course_code>/modules/progress/<user_id>', methods=['GET'])
+@bp.route('/courses/<course_code>/modules/progress/<user_id>', methods=['GET'])
 def get_module_progress(course_code, user_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
 
-        # fetch all modules in order for the course
+        # compute unlock status for every module in one statement:
+        #   - count assignments and the user's completed (graded) assignments per module
+        #   - LAG looks at the previous module in sequence; the first module has none
+        #     and is always unlocked
         cursor.execute("""
-            SELECT id, module_sequence FROM course_modules
-            WHERE course_code = %s
+            WITH module_counts AS (
+                SELECT
+                    cm.id,
+                    cm.module_sequence,
+                    COUNT(ca.assignment_id) AS assignment_count,
+                    COUNT(g.assignment_id) AS completed_count
+                FROM course_modules cm
+                LEFT JOIN course_assignments ca ON ca.module_id = cm.id
+                LEFT JOIN grades g ON g.assignment_id = ca.assignment_id AND g.user_id = %s
+                WHERE cm.course_code = %s
+                GROUP BY cm.id, cm.module_sequence
+            )
+            SELECT
+                id AS module_id,
+                COALESCE(
+                    LAG(completed_count = assignment_count) OVER (ORDER BY module_sequence),
+                    TRUE
+                ) AS unlocked
+            FROM module_counts
             ORDER BY module_sequence
-        """, (course_code,))
-        modules = cursor.fetchall()
-
-        # fetch all assignments the user has completed
-        cursor.execute("""
-            SELECT assignment_id FROM grades
-            WHERE user_id = %s
-        """, (user_id,))
-        completed_assignments = set(row['assignment_id'] for row in cursor.fetchall())
-
-        # collect all module IDs to fetch related assignments in a single query
-        module_ids = [mod['id'] for mod in modules]
-        assignment_rows = []
-        if module_ids:
-            placeholders = ','.join(['%s'] * len(module_ids))
-            query = f"""
-                SELECT module_id, assignment_id FROM course_assignments
-                WHERE module_id IN ({placeholders})
-            """
-            cursor.execute(query, module_ids)
-            assignment_rows = cursor.fetchall()
-
-        # group assignment IDs by module ID
-        assignments_by_module = {}
-        for row in assignment_rows:
-            mod_id = row['module_id']
-            if mod_id not in assignments_by_module:
-                assignments_by_module[mod_id] = []
-            assignments_by_module[mod_id].append(row['assignment_id'])
-
-        # compute unlock status per module
-        unlock_status = []
-        for i, mod in enumerate(modules):
-            module_id = mod['id']
-            if i == 0:
-                # first module is always unlocked
-                unlocked = True
-            else:
-                # unlock if all previous module's assignments are completed
-                prev_mod_id = modules[i - 1]['id']
-                prev_assignments = assignments_by_module.get(prev_mod_id, [])
-                unlocked = all(a in completed_assignments for a in prev_assignments)
-
-            unlock_status.append({ 'module_id': module_id, 'unlocked': unlocked })
+        """, (user_id, course_code))
+        unlock_status = cursor.fetchall()
 
         return jsonify(unlock_status), 200
 
@@ -677,8 +1631,588 @@ def get_module_progress(course_code, user_id):
 
 
 
+# ------------------------- Recent History Store -------------------------------
+# Per-user ring buffer of the last RECENT_HISTORY_SIZE chat messages (with vectors),
+# so building recent context costs O(recent turns for this user), not a scan of the
+# whole collection. On a miss, or once a buffer is older than RECENT_HISTORY_TTL
+# seconds (another gunicorn worker may have handled the user's last turns), it is
+# reloaded with a user_id-filtered, timestamp-ordered Qdrant scroll. If that scroll
+# fails (other than for a missing timestamp index) the turn gets no recent history
+# and nothing is cached, so the next turn retries.
+# ---------------------------------------------------------------------------
+RECENT_HISTORY_SIZE = int(os.getenv("RECENT_HISTORY_SIZE", 20))
+RECENT_HISTORY_TTL = float(os.getenv("RECENT_HISTORY_TTL", 120))
+RECENT_HISTORY_MAX_USERS = int(os.getenv("RECENT_HISTORY_MAX_USERS", 1000))
+
+
+def is_missing_order_index(error):
+    """True for Qdrant's 400 when order_by targets a field without a range index."""
+    return error.status_code == 400 and b"order_by" in (error.content or b"")
+
+
+class RecentHistoryStore:
+    """Bounded per-user buffers of recent chat messages, oldest first."""
+
+    def __init__(self, size, ttl, max_users):
+        self.size = size
+        self.ttl = ttl
+        self.max_users = max_users
+        self._buffers = OrderedDict()   # user_id -> (loaded_at, deque of messages)
+        self._lock = threading.Lock()
+
+    def _load(self, user_id):
+        user_filter = Filter(must=[FieldCondition(key="user_id", match=MatchValue(value=user_id))])
+        try:
+            with timed_stage("qdrant_scroll"):
+                points, _ = qdrant_client.scroll(
+                    collection_name=collection_name,
+                    scroll_filter=user_filter,
+                    order_by=OrderBy(key="timestamp", direction=Direction.DESC),
+                    limit=self.size,
+                    with_payload=True,
+                    with_vectors=True
+                )
+        except UnexpectedResponse as e:
+            # ordering needs a payload index on timestamp; only that error falls back
+            if not is_missing_order_index(e):
+                raise
+            logging.warning(f"No timestamp index for ordered history scroll, falling back to filtered scroll: {e}")
+            with timed_stage("qdrant_scroll"):
+                points, _ = qdrant_client.scroll(
+                    collection_name=collection_name,
+                    scroll_filter=user_filter,
+                    limit=self.size,
+                    with_payload=True,
+                    with_vectors=True
+                )
+
+        messages = [
+            {
+                "role": point.payload["role"],
+                "content": point.payload["content"],
+                "timestamp": point.payload.get("timestamp", 0),
+                "vector": point.vector
+            }
+            for point in points
+            if "role" in point.payload and "content" in point.payload
+        ]
+        messages.sort(key=lambda msg: msg["timestamp"])
+        return deque(messages[-self.size:], maxlen=self.size)
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._buffers.get(user_id)
+            if entry and time.time() - entry[0] < self.ttl:
+                self._buffers.move_to_end(user_id)
+                return list(entry[1])
+
+        try:
+            buffer = self._load(user_id)
+        except Exception as e:
+            # answer without context rather than cache a wrong buffer for the TTL
+            logging.warning(f"Recent history load failed for {user_id}, continuing without it: {e}")
+            return []
+        with self._lock:
+            self._buffers[user_id] = (time.time(), buffer)
+            self._buffers.move_to_end(user_id)
+            while len(self._buffers) > self.max_users:
+                self._buffers.popitem(last=False)
+            return list(buffer)
+
+    def append(self, user_id, message):
+        # only extend buffers that are already loaded; a miss reloads from Qdrant anyway
+        with self._lock:
+            entry = self._buffers.get(user_id)
+            if entry:
+                entry[1].append(message)
+
+
+recent_history_store = RecentHistoryStore(RECENT_HISTORY_SIZE, RECENT_HISTORY_TTL, RECENT_HISTORY_MAX_USERS)
+
+
+# ------------------------- Chat Write-Behind Queue ----------------------------
+# Chat messages are persisted to chat_history off the request thread. A background
+# thread drains a bounded queue in batches: messages without a vector are embedded
+# with one embeddings call, then the batch is upserted with one Qdrant call.
+#   - CHAT_WRITE_QUEUE_SIZE: pending messages before requests write synchronously
+#   - CHAT_WRITE_BATCH_SIZE: max messages per embeddings/upsert call
+#   - CHAT_WRITE_FLUSH_INTERVAL: max seconds a message waits for its batch to fill
+#   - CHAT_WRITE_MAX_ATTEMPTS: tries per batch before it is dropped (counted in
+#     tutortech_chat_messages_dropped_total)
+#   - CHAT_WRITE_RETRY_BACKOFF: seconds before the first retry; doubles each time
+# Pending messages are flushed at interpreter exit. Point IDs are UUIDs so two
+# messages stored in the same millisecond never overwrite each other; a message
+# keeps its ID across retries, so a retried upsert cannot duplicate it.
+# ---------------------------------------------------------------------------
+CHAT_WRITE_QUEUE_SIZE = int(os.getenv("CHAT_WRITE_QUEUE_SIZE", 1000))
+CHAT_WRITE_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", 32))
+CHAT_WRITE_FLUSH_INTERVAL = float(os.getenv("CHAT_WRITE_FLUSH_INTERVAL", 0.5))
+CHAT_WRITE_MAX_ATTEMPTS = int(os.getenv("CHAT_WRITE_MAX_ATTEMPTS", 5))
+CHAT_WRITE_RETRY_BACKOFF = float(os.getenv("CHAT_WRITE_RETRY_BACKOFF", 0.5))
+
+CHAT_MESSAGES_DROPPED = Counter(
+    "tutortech_chat_messages_dropped_total", "Chat messages not persisted after all write-behind retries"
+)
+
+
+class ChatWriteQueue:
+    """Bounded write-behind queue that embeds and upserts chat messages in batches."""
+
+    def __init__(self, max_size, batch_size, flush_interval, max_attempts, retry_backoff):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+
+    def _ensure_worker(self):
+        # threads do not survive a fork, so each worker process starts its own
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="chat-write-behind", daemon=True)
+                self._thread.start()
+
+    def put(self, message):
+        # synchronous writes go through the same retry/drop path as the worker, so a
+        # Qdrant or embedding failure never surfaces as an error in the chat turn
+        if self._stopping:
+            self._write_with_retry([message])
+            return
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            # apply backpressure instead of dropping history
+            self._write_with_retry([message])
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._write_with_retry(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_with_retry(self, batch):
+        # retry in place so messages keep their order; put() writes synchronously
+        # if the queue fills up meanwhile
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self._write(batch)
+                return
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    CHAT_MESSAGES_DROPPED.inc(len(batch))
+                    logging.error(f"Dropping chat history batch of {len(batch)} after {attempt} attempts: {e}")
+                    return
+                delay = self.retry_backoff * 2 ** (attempt - 1)
+                logging.warning(f"Chat history batch of {len(batch)} failed (attempt {attempt}), retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+    def _write(self, batch):
+        unembedded = [message for message in batch if message["vector"] is None]
+        if unembedded:
+            for message, embedding in zip(unembedded, embed_texts([m["content"] for m in unembedded])):
+                # the same dict sits in the recent-history buffer, so it gains its vector too
+                message["vector"] = embedding
+
+        with timed_stage("qdrant_upsert"):
+            qdrant_client.upsert(
+                collection_name=collection_name,
+                points=[
+                    PointStruct(
+                        id=message.setdefault("point_id", str(uuid.uuid4())),
+                        vector=message["vector"],
+                        payload={
+                            "user_id": message["user_id"],
+                            "role": message["role"],
+                            "content": message["content"],
+                            "timestamp": message["timestamp"]
+                        }
+                    )
+                    for message in batch
+                ]
+            )
+
+    def flush(self, timeout=10):
+        """Block until queued messages are written (or timeout), e.g. at shutdown."""
+        self._stopping = True
+        if self._thread is None or self._pid != os.getpid():
+            return
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.05)
+
+
+chat_write_queue = ChatWriteQueue(
+    CHAT_WRITE_QUEUE_SIZE, CHAT_WRITE_BATCH_SIZE, CHAT_WRITE_FLUSH_INTERVAL,
+    CHAT_WRITE_MAX_ATTEMPTS, CHAT_WRITE_RETRY_BACKOFF
+)
+atexit.register(chat_write_queue.flush)
+
+
+# ------------------------- Chat Helpers -------------------------------------
+# store_chat_message: queue a chat message for the write-behind pipeline
+# stream_chat_completion: forward GPT-4o deltas to the browser as Server-Sent
+#   Events. Each event is a JSON object:
+#       {"delta": "..."}                      -> next chunk of the answer
+#       {"done": true, "response": "..."}     -> full answer once generation ends
+#       {"error": "..."}                      -> generation failed mid-stream
+#   on_complete(full_text) runs after the last delta has been sent so storage
+#   never delays the first token.
+# ---------------------------------------------------------------------------
+def store_chat_message(user_id, role, content, embedding=None):
+    message = {
+        "user_id": user_id,
+        "role": role,
+        "content": content,
+        "timestamp": time.time(),
+        "vector": embedding
+    }
+    recent_history_store.append(user_id, message)
+    chat_write_queue.put(message)
+
+
+def sse_event(payload):
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def stream_chat_completion(messages, on_complete=None):
+    route = metrics_route.get()
+
+    def generate():
+        # the body is iterated after the view returns; keep timings under the route
+        metrics_route.set(route)
+        parts = []
+        try:
+            with timed_stage("completion", "gpt-4o"):
+                stream = client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=messages,
+                    stream=True
+                )
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        parts.append(delta)
+                        yield sse_event({"delta": delta})
+        except Exception as e:
+            print(f"Error while streaming chat completion: {e}")
+            yield sse_event({"error": "Failed to process the request"})
+            return
+
+        ai_response = "".join(parts)
+        yield sse_event({"done": True, "response": ai_response})
+
+        if on_complete:
+            try:
+                on_complete(ai_response)
+            except Exception as e:
+                print(f"Error storing streamed chat response: {e}")
+
+    return sse_response(generate())
+
+
+def sse_response(events):
+    response = Response(events, mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"   # keep proxies from buffering the stream
+    return response
+
+
+# ------------------------- Chat Pipeline Stages ----------------------------
+# The I/O stages of a chat turn that don't depend on each other run side by side
+# on chat_stage_executor:
+#   recent history (Qdrant scroll / in-process buffer)
+#   Custom-bot preferences (Postgres)
+#   prompt embedding (OpenAI) -> semantic search (Qdrant)
+# so the time before the completion starts is roughly the slowest single chain.
+#   - CHAT_STAGE_WORKERS: stage threads per worker process
+# ---------------------------------------------------------------------------
+CHAT_STAGE_WORKERS = int(os.getenv("CHAT_STAGE_WORKERS", 16))
+
+chat_stage_executor = ThreadPoolExecutor(max_workers=CHAT_STAGE_WORKERS, thread_name_prefix="chat-stage")
+
+
+def session_custom_system_message(user_id):
+    """Custom bot system prompt from the request's session cookie, or None if it must be loaded."""
+    claims, signed_at = read_session_cookie()
+    if not claims or claims["user_id"] != user_id or "preferences" not in claims or session_claims_stale(signed_at):
+        return None
+    key = claims["preferences"]
+    # JSON turns the key tuple into a list
+    return CUSTOM_SYSTEM_PROMPTS.get(tuple(key) if key is not None else None)
+
+
+def fetch_custom_system_message(user_id):
+    """Load the user's session claims and build their Custom bot system prompt.
+
+    Returns (system_message, claims); claims is None for an unknown user.
+    """
+    # stage threads have no request context, so this connection is closed here
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        with timed_stage("db_query"):
+            claims = load_session_claims(cursor, user_id)
+    finally:
+        conn.close()
+    return CUSTOM_SYSTEM_PROMPTS[claims["preferences"] if claims else None], claims
+
+
+def refresh_session_cookie(claims):
+    """Re-issue the request's session cookie from freshly loaded claims when the response is sent.
+
+    Keeps the following Custom bot turns DB-free for another SESSION_REFRESH_AFTER
+    seconds; revoked or other users' cookies are left for /session to reject.
+    """
+    current, _ = read_session_cookie()
+    if not current or current["user_id"] != claims["user_id"] or session_revoked(current, claims):
+        return
+
+    @after_this_request
+    def set_refreshed_cookie(response):
+        set_session_cookie(response, claims)
+        return response
+
+
+def embed_and_search_prompt(user_id, prompt, search=True):
+    """Embed the prompt and, if asked, find this user's semantically similar past messages."""
+    user_embedding = embed_text(prompt)
+    semantic_history = []
+    if search:
+        with timed_stage("qdrant_search"):
+            search_results = qdrant_client.query_points(
+                collection_name=collection_name,
+                query=user_embedding,
+                limit=5,
+                query_filter=Filter(
+                    must=[FieldCondition(key="user_id", match={"value": user_id})]
+                ),
+                with_payload=True,
+                with_vectors=False,
+                score_threshold=0.75
+            ).points
+        semantic_history = [
+            {"role": item.payload["role"], "content": item.payload["content"]}
+            for item in search_results
+        ]
+    return user_embedding, semantic_history
+
+
+# ------------------------- Semantic Answer Cache ---------------------------
+# Opt-in (CHAT_ANSWER_CACHE=1). Students in a course keep asking the same
+# conceptual questions, so a prompt whose embedding is within
+# CHAT_ANSWER_CACHE_THRESHOLD cosine similarity of an earlier one is answered
+# with the earlier GPT-4o answer. Only turns sent without conversational context
+# (no history, no injected last pair) are looked up or stored, because their
+# answer depends on nothing but the prompt and the system message.
+#   - scope: (bot type, sha256 of the system message, course id); the Custom
+#     bot's system message comes from the user's preferences, so it is covered
+#   - CHAT_ANSWER_CACHE_SIZE: entries per worker process (LRU across scopes)
+#   - CHAT_ANSWER_CACHE_TTL: seconds an answer may be reused
+# Per-process; hit rates are on /answer-cache-stats and /metrics.
+# ---------------------------------------------------------------------------
+ANSWER_CACHE_LOOKUPS = Counter(
+    "tutortech_answer_cache_lookups_total", "Semantic answer cache lookups", ["result"]
+)
+
+
+class SemanticAnswerCache:
+    """Similarity-matched GPT-4o answers per scope, bounded by size and age."""
+
+    def __init__(self, enabled, max_entries, ttl, threshold):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._scopes = {}               # scope -> {"entries": OrderedDict, "matrix": ndarray or None}
+        self._lru = OrderedDict()       # entry id -> scope, least recently used first
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+    @staticmethod
+    def make_scope(bot_type, system_message, course_id):
+        return (bot_type, hashlib.sha256(system_message.encode("utf-8")).hexdigest(), course_id or "")
+
+    def _remove(self, entry_id, scope):
+        bucket = self._scopes[scope]
+        del bucket["entries"][entry_id]
+        bucket["matrix"] = None
+        if not bucket["entries"]:
+            del self._scopes[scope]
+        self._lru.pop(entry_id, None)
+
+    def lookup(self, scope, embedding):
+        """Cached answer for a near-identical prompt in this scope, or None."""
+        if not self.enabled or embedding is None:
+            return None
+
+        query = np.array(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) + 1e-8
+        now = time.time()
+        with self._lock:
+            bucket = self._scopes.get(scope)
+            answer = None
+            if bucket:
+                expired = [i for i, (created, _, _) in bucket["entries"].items() if now - created > self.ttl]
+                for entry_id in expired:
+                    self._remove(entry_id, scope)
+                self._stats["expired"] += len(expired)
+                bucket = self._scopes.get(scope)
+
+            if bucket:
+                ids = list(bucket["entries"])
+                if bucket["matrix"] is None:
+                    # rows are stored normalized, so the dot product is the cosine similarity
+                    bucket["matrix"] = np.stack([bucket["entries"][i][1] for i in ids])
+                similarity = bucket["matrix"] @ query
+                best = int(np.argmax(similarity))
+                if similarity[best] >= self.threshold:
+                    answer = bucket["entries"][ids[best]][2]
+                    self._lru.move_to_end(ids[best])
+
+            self._stats["hits" if answer is not None else "misses"] += 1
+        ANSWER_CACHE_LOOKUPS.labels("hit" if answer is not None else "miss").inc()
+        return answer
+
+    def store(self, scope, embedding, answer):
+        if not self.enabled or embedding is None or not answer:
+            return
+
+        vector = np.array(embedding, dtype=np.float32)
+        vector /= np.linalg.norm(vector) + 1e-8
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            bucket = self._scopes.setdefault(scope, {"entries": OrderedDict(), "matrix": None})
+            bucket["entries"][entry_id] = (time.time(), vector, answer)
+            bucket["matrix"] = None
+            self._lru[entry_id] = scope
+            self._stats["stores"] += 1
+
+            while len(self._lru) > self.max_entries:
+                oldest_id, oldest_scope = next(iter(self._lru.items()))
+                self._remove(oldest_id, oldest_scope)
+                self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"enabled": self.enabled, "entries": len(self._lru), "scopes": len(self._scopes)})
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+answer_cache = SemanticAnswerCache(
+    enabled=os.getenv("CHAT_ANSWER_CACHE") == "1",
+    max_entries=int(os.getenv("CHAT_ANSWER_CACHE_SIZE", 2000)),
+    ttl=float(os.getenv("CHAT_ANSWER_CACHE_TTL", 86400)),
+    threshold=float(os.getenv("CHAT_ANSWER_CACHE_THRESHOLD", 0.96))
+)
+
+
+def cached_answer_response(answer, stream):
+    """Reply with a cached answer in the same shape as a fresh one."""
+    if not stream:
+        return jsonify({"response": answer}), 200
+    return sse_response([sse_event({"delta": answer}), sse_event({"done": True, "response": answer})])
+
+
+# Semantic answer cache hit/miss counters for monitoring
+@bp.route("/answer-cache-stats")
+def answer_cache_stats():
+    return jsonify(answer_cache.stats()), 200
+
+
+# ------------------------- Chat Context Budget ----------------------------
+# Caps the prompt sent to GPT-4o (system + history + user prompt) per bot type.
+# Tokens are estimated at ~4 characters each plus a small per-message overhead,
+# which is close enough for English text without a tokenizer dependency.
+# When the estimate is over budget:
+#   1. history messages longer than CHAT_HISTORY_MESSAGE_MAX_TOKENS are cut short
+#   2. history is dropped from the end, i.e. lowest value first (merge_histories
+#      returns relevant recent turns first, then semantic matches best-first)
+# The system message and the user prompt are never trimmed.
+#   - CHAT_CONTEXT_BUDGET_<BOT>: token budget for Tutor, Mentor, Co-Learner, Custom
+# ---------------------------------------------------------------------------
+CHAT_CONTEXT_BUDGETS = {
+    "Tutor": int(os.getenv("CHAT_CONTEXT_BUDGET_TUTOR", 2000)),
+    "Mentor": int(os.getenv("CHAT_CONTEXT_BUDGET_MENTOR", 1600)),
+    "Co-Learner": int(os.getenv("CHAT_CONTEXT_BUDGET_CO_LEARNER", 800)),
+    "Custom": int(os.getenv("CHAT_CONTEXT_BUDGET_CUSTOM", 2000)),
+}
+CHAT_CONTEXT_DEFAULT_BUDGET = int(os.getenv("CHAT_CONTEXT_DEFAULT_BUDGET", 1600))
+CHAT_HISTORY_MESSAGE_MAX_TOKENS = int(os.getenv("CHAT_HISTORY_MESSAGE_MAX_TOKENS", 300))
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(message):
+    return len(message["content"]) // 4 + 1 + MESSAGE_OVERHEAD_TOKENS
+
+
+def truncate_message(message, max_tokens):
+    max_chars = max_tokens * 4
+    if len(message["content"]) <= max_chars:
+        return message
+    return {"role": message["role"], "content": message["content"][:max_chars].rstrip() + " ..."}
+
+
+def build_chat_context(bot_type, system_message, history, prompt):
+    """System message, as much history as the bot's budget allows, then the user prompt."""
+    budget = CHAT_CONTEXT_BUDGETS.get(bot_type, CHAT_CONTEXT_DEFAULT_BUDGET)
+    system = {"role": "system", "content": system_message}
+    user = {"role": "user", "content": prompt}
+
+    requested = sum(estimate_tokens(m) for m in [system, *history, user])
+    available = budget - estimate_tokens(system) - estimate_tokens(user)
+
+    kept = []
+    if requested <= budget:
+        kept = list(history)
+    else:
+        for message in history:
+            message = truncate_message(message, CHAT_HISTORY_MESSAGE_MAX_TOKENS)
+            if estimate_tokens(message) > available:
+                break   # everything after this is lower value
+            kept.append(message)
+            available -= estimate_tokens(message)
+
+    messages = [system, *kept, user]
+    used = sum(estimate_tokens(m) for m in messages)
+    if used < requested:
+        print(f"\n✂️ Context trimmed for {bot_type}: ~{requested} -> ~{used} tokens "
+              f"(saved ~{requested - used}, kept {len(kept)}/{len(history)} history messages)")
+    return messages
+
+
 # ------------------------- AI Chat -------------------------------------- 
-@app.route('/api/chat', methods=['POST', 'OPTIONS'])
+@bp.route('/api/chat', methods=['POST', 'OPTIONS'])
 def chat():
     if request.method == 'OPTIONS':
         response = make_response()
@@ -700,6 +2234,8 @@ def chat():
             }), 200
         user_id = data.get('userId')
         history_enabled = data.get('historyEnabled', True)
+        stream = data.get('stream', False)
+        course_id = data.get('courseId')
 
         # Choose system message
         bot_prompts = {
@@ -726,16 +2262,30 @@ def chat():
         }
 
 
-        # Fecth the users custom learning preference
+        # Check if prompt is vague (decides whether semantic search is needed)
+        inject_last_pair = is_vague_prompt(prompt)
+
+        # Start the independent stages together; each is awaited only where it is needed
+        preference_future = None
+        system_message = None
         if bot_type == "Custom":
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT learning_preferences FROM student_information WHERE user_id = %s", (user_id,))
-            result = cursor.fetchone()
-            preferences = json.loads(result["learning_preferences"]) if result and result["learning_preferences"] else {}
-            system_message = generate_prompt_from_preferences(preferences)
-        else:
+            # Fecth the users custom learning preference (unless their session cookie carries it)
+            system_message = session_custom_system_message(user_id)
+            if system_message is None:
+                preference_future = submit_in_route(chat_stage_executor, fetch_custom_system_message, user_id)
+        if history_enabled:
+            history_future = submit_in_route(chat_stage_executor, recent_history_store.get, user_id)
+            prompt_future = submit_in_route(chat_stage_executor, embed_and_search_prompt, user_id, prompt, not inject_last_pair)
+        elif answer_cache.enabled:
+            prompt_future = submit_in_route(chat_stage_executor, embed_and_search_prompt, user_id, prompt, False)
+
+        if preference_future is not None:
+            system_message, claims = preference_future.result()
+            if claims:
+                refresh_session_cookie(claims)
+        elif system_message is None:
             system_message = bot_prompts.get(bot_type, "You are a helpful assistant. If the user's request seems vague, reference their last message or your most recent answer.")
+        answer_scope = SemanticAnswerCache.make_scope(bot_type, system_message, course_id)
 
         if not history_enabled:
             print("\n🚫 History is disabled. Skipping context.")
@@ -744,66 +2294,47 @@ def chat():
                 {"role": "user", "content": prompt}
             ]
 
-            completion = client.chat.completions.create(
-                model="gpt-4o",
-                messages=messages
-            )
-
-            ai_response = completion.choices[0].message.content
-            return jsonify({"response": ai_response}), 200
-
-        # Load scroll BEFORE storing the prompt
-        scroll_result, _ = qdrant_client.scroll(
-            collection_name=collection_name,
-            limit=20,
-            with_payload=True,
-            with_vectors=False
-        )
+            # Answer repeated questions from the semantic cache (when enabled)
+            prompt_embedding = prompt_future.result()[0] if answer_cache.enabled else None
+            cached_answer = answer_cache.lookup(answer_scope, prompt_embedding)
+            if cached_answer is not None:
+                return cached_answer_response(cached_answer, stream)
 
-        # Embed and store the user prompt
-        user_embedding = embed_text(prompt)
-        timestamp = time.time()
+            if stream:
+                return stream_chat_completion(
+                    messages,
+                    on_complete=lambda ai_response: answer_cache.store(answer_scope, prompt_embedding, ai_response)
+                )
 
-        qdrant_client.upsert(
-            collection_name=collection_name,
-            points=[
-                PointStruct(
-                    id=int(timestamp * 1000),
-                    vector=user_embedding,
-                    payload={"user_id": user_id, "role": "user", "content": prompt, "timestamp": timestamp}
+            with timed_stage("completion", "gpt-4o"):
+                completion = client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=messages
                 )
-            ]
-        )
 
-        # Sort scroll results and build recent history
-        sorted_history = sorted(
-            scroll_result,
-            key=lambda msg: msg.payload.get("timestamp", 0)
-        )
+            ai_response = completion.choices[0].message.content
+            answer_cache.store(answer_scope, prompt_embedding, ai_response)
+            return jsonify({"response": ai_response}), 200
 
-        recent_history = [
-            {"role": msg.payload["role"], "content": msg.payload["content"]}
-            for msg in sorted_history[-6:]
-        ]
+        # This user's recent history, loaded BEFORE storing the prompt (oldest first)
+        sorted_history = history_future.result()
 
-        # Ignore latest prompt (So we dont match the user prompt with itself)
-        filtered_history = [
-            msg for msg in sorted_history
-            if msg.payload.get("content") != prompt and "role" in msg.payload and "content" in msg.payload
-        ]
+        # Embedded prompt (+ semantic matches, only used if last_pair is NOT injected);
+        # queue the prompt for storage once both are in hand
+        user_embedding, semantic_history = prompt_future.result()
+        store_chat_message(user_id, "user", prompt, user_embedding)
+
+        # Build recent history
+        recent_history = sorted_history[-6:]
 
         # Filter recent messages (last 10 mins or 15 entries)
         cutoff = time.time() - (10 * 60)  # 10 minutes ago
         filtered_history = [
             msg for msg in sorted_history[-15:]  # last 15 messages
-            if msg.payload.get("timestamp", 0) >= cutoff
-            and msg.payload.get("content") != prompt
-            and "role" in msg.payload and "content" in msg.payload
+            if msg["timestamp"] >= cutoff
+            and msg["content"] != prompt
         ]
 
-        # Check if prompt is vague
-        inject_last_pair = is_vague_prompt(prompt)
-
         # Attempt to inject last user→assistant pair (Attempt is the right word)
         last_pair = []
         if inject_last_pair:
@@ -811,74 +2342,58 @@ def chat():
                 u = filtered_history[i - 1]
                 a = filtered_history[i]
 
-                if u.payload["role"] == "user" and a.payload["role"] == "assistant":
+                if u["role"] == "user" and a["role"] == "assistant":
                     last_pair = [
-                        {"role": "user", "content": u.payload["content"]},
-                        {"role": "assistant", "content": a.payload["content"]}
+                        {"role": "user", "content": u["content"]},
+                        {"role": "assistant", "content": a["content"]}
                     ]
                     # A dash of debugging
                     print("\n✅ Using conversation pairing for vague prompt.")
-                    print(f"user: {u.payload['content'][:80]}...")
-                    print(f"assistant: {a.payload['content'][:80]}...")
+                    print(f"user: {u['content'][:80]}...")
+                    print(f"assistant: {a['content'][:80]}...")
                     break
 
-        # Semantic search (only used if last_pair is NOT injected)
-        semantic_history = []
-        if not inject_last_pair:
-            search_results = qdrant_client.search(
-                collection_name=collection_name,
-                query_vector=user_embedding,
-                limit=5,
-                query_filter=Filter(
-                    must=[FieldCondition(key="user_id", match={"value": user_id})]
-                ),
-                with_payload=True,
-                with_vectors=False,
-                score_threshold=0.75
-            )
-            semantic_history = [
-                {"role": item.payload["role"], "content": item.payload["content"]}
-                for item in search_results
-            ]
-
         # Merge history if no last_pair
         history = []
         if not inject_last_pair:
-            history = merge_histories(semantic_history, recent_history, user_embedding, qdrant_client)
+            history = merge_histories(semantic_history, recent_history, user_embedding)
 
-        # Build final message context
-        messages = [{"role": "system", "content": system_message}]
-        if inject_last_pair:
-            messages += last_pair
-        else:
-            messages += history
-        messages.append({"role": "user", "content": prompt})
+        # Build final message context within the bot's token budget
+        messages = build_chat_context(
+            bot_type, system_message, last_pair if inject_last_pair else history, prompt
+        )
+
+        # A turn without conversational context can be answered from the semantic cache
+        cacheable = not inject_last_pair and not history
+        cached_answer = answer_cache.lookup(answer_scope, user_embedding) if cacheable else None
+        if cached_answer is not None:
+            print("\n♻️ Answered from the semantic answer cache.")
+            store_chat_message(user_id, "assistant", cached_answer)
+            return cached_answer_response(cached_answer, stream)
+
+        def finish_turn(ai_response):
+            # Queue assistant reply for storage
+            store_chat_message(user_id, "assistant", ai_response)
+            if cacheable:
+                answer_cache.store(answer_scope, user_embedding, ai_response)
 
         # Debug final messages
         print("\n📤 Final Message Stack:")
         for m in messages:
             print(f"{m['role']}: {m['content'][:80]}...")
 
+        # Stream the answer and store the assistant reply once it is complete
+        if stream:
+            return stream_chat_completion(messages, on_complete=finish_turn)
+
         # Send to OpenAI
-        completion = client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages
-        )
+        with timed_stage("completion", "gpt-4o"):
+            completion = client.chat.completions.create(
+                model="gpt-4o",
+                messages=messages
+            )
         ai_response = completion.choices[0].message.content
-
-        # Store assistant reply
-        ai_embedding = embed_text(ai_response)
-        ai_timestamp = time.time()
-        qdrant_client.upsert(
-            collection_name=collection_name,
-            points=[
-                PointStruct(
-                    id=int(ai_timestamp * 1000),
-                    vector=ai_embedding,
-                    payload={"user_id": user_id, "role": "assistant", "content": ai_response, "timestamp": ai_timestamp}
-                )
-            ]
-        )
+        finish_turn(ai_response)
 
         return jsonify({"response": ai_response}), 200
 
@@ -886,7 +2401,7 @@ def chat():
         print(f"Error in chat function: {e}")
         return jsonify({"error": "Failed to process the request"}), 500
 
-@app.route('/update-history-setting', methods=['POST'])
+@bp.route('/update-history-setting', methods=['POST'])
 def update_history_setting():
     data = request.json
     user_id = data.get("user_id")
@@ -895,40 +2410,61 @@ def update_history_setting():
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE student_information SET history_enabled = %s WHERE user_id = %s",
-            (history_enabled, user_id)
-        )
+        cursor.execute("""
+            UPDATE student_information
+            SET history_enabled = %s
+            WHERE user_id = %s
+            RETURNING user_id, first_name, last_name, email, history_enabled, learning_preferences, session_version
+        """, (history_enabled, user_id))
+        user_info = cursor.fetchone()
         conn.commit()
-        return jsonify({"message": "History setting updated"}), 200
+
+        response = make_response(jsonify({"message": "History setting updated"}))
+        if user_info:
+            reissue_session_cookie(response, user_info)
+        return response, 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
         conn.close()
 
 # ------------------------- Save Preferences -------------------------------------- 
-@app.route('/save-preferences', methods=['POST'])
+@bp.route('/save-preferences', methods=['POST'])
 def save_preferences():
     data = request.json
     user_id = data.get("user_id")
     preferences = data.get("preferences")  # expects a dictionary
 
+    # only the quiz's fields and choices ('' = not answered yet) may be stored
+    if not isinstance(preferences, dict) or any(
+        field not in PREFERENCE_OPTIONS or (value != "" and value not in PREFERENCE_OPTIONS[field])
+        for field, value in preferences.items()
+    ):
+        return jsonify({"error": "Invalid preferences"}), 400
+
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE student_information SET learning_preferences = %s WHERE user_id = %s",
-            (json.dumps(preferences), user_id)
-        )
+        cursor.execute("""
+            UPDATE student_information SET learning_preferences = %s
+            WHERE user_id = %s
+            RETURNING user_id, first_name, last_name, email, history_enabled, learning_preferences, session_version
+        """, (json.dumps(preferences), user_id))
+        user_info = cursor.fetchone()
         conn.commit()
-        return jsonify({"message": "Preferences saved"}), 200
+
+        response = make_response(jsonify({"message": "Preferences saved"}))
+        # Custom bot turns read the preference key from the caller's session cookie
+        if user_info:
+            reissue_session_cookie(response, user_info)
+        return response, 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
         conn.close()
 
 # ------------------------- Get Preferences  -------------------------------------- 
-@app.route('/get-preferences', methods=['GET'])
+@bp.route('/get-preferences', methods=['GET'])
 def get_preferences():
     user_id = request.args.get("user_id")
 
@@ -959,7 +2495,7 @@ def get_preferences():
         return jsonify({"error": str(e)}), 500
 
 # ------------------------- Course Enrollment -------------------------------------- 
-@app.route('/enroll', methods=['POST'])
+@bp.route('/enroll', methods=['POST'])
 def enroll_course():
     data = request.json
     user_id = data.get("user_id")
@@ -979,6 +2515,18 @@ def enroll_course():
             "INSERT INTO enrollments (user_id, course_code) VALUES (%s, %s)",
             (user_id, course_code)
         )
+
+        # start (or re-flag) the progress rollup for this course
+        cursor.execute("""
+            INSERT INTO user_course_progress (user_id, course_code, enrolled, total_count)
+            SELECT %s, %s, TRUE, COUNT(ca.assignment_id)
+            FROM course_modules cm
+            LEFT JOIN course_assignments ca ON ca.module_id = cm.id
+            WHERE cm.course_code = %s
+            ON CONFLICT (user_id, course_code) DO UPDATE SET
+                enrolled = TRUE,
+                total_count = EXCLUDED.total_count;
+        """, (user_id, course_code, course_code))
         conn.commit()
         return jsonify({"message": "Enrolled successfully"}), 200
 
@@ -989,7 +2537,7 @@ def enroll_course():
         if conn:
             conn.close()
 
-@app.route('/enrolled-courses/<user_id>', methods=['GET'])
+@bp.route('/enrolled-courses/<user_id>', methods=['GET'])
 def get_enrolled_courses(user_id):
     try:
         conn = get_db_connection()
@@ -1021,7 +2569,7 @@ def get_enrolled_courses(user_id):
 #   - Retrieve all questions for a specific assignment
 #   - Includes correct answers and options for each question
 # -----------------------------------------------------------------------------------
-@app.route('/api/assignments/<assignment_id>/questions', methods=['GET'])
+@bp.route('/api/assignments/<assignment_id>/questions', methods=['GET'])
 def get_assignment_questions(assignment_id):
     try:
         conn = get_db_connection()
@@ -1043,12 +2591,36 @@ def get_assignment_questions(assignment_id):
         print(f"Error fetching questions: {e}")
         return jsonify({"error": "Failed to fetch questions"}), 500
 
+# ------------------------ AI Grading Worker Pool ------------------------
+# Free-response questions of a submission are graded concurrently on a shared,
+# bounded pool so one request costs roughly one GPT-4o round trip, not one per question.
+#   - GRADING_MAX_WORKERS: concurrent grading calls per worker process
+#   - GRADING_QUESTION_TIMEOUT: seconds allowed for a single grading call
+#   - GRADING_SUBMISSION_DEADLINE: seconds allowed for all text questions of one
+#     submission; anything unfinished is scored 0, same as a failed grading call
+#   - GRADING_BATCH: "1" opts in to grading all text questions of a submission in one
+#     structured GPT-4o call, falling back to per-question calls only for items that
+#     fail validation (default "0": per-question grading only)
+#   - GRADING_BATCH_TIMEOUT: seconds allowed for the batch call (single attempt, no
+#     retries); whatever is left of the submission deadline goes to the fallback
+# ------------------------------------------------------------------------
+GRADING_MAX_WORKERS = int(os.getenv("GRADING_MAX_WORKERS", 8))
+GRADING_QUESTION_TIMEOUT = float(os.getenv("GRADING_QUESTION_TIMEOUT", 30))
+GRADING_SUBMISSION_DEADLINE = float(os.getenv("GRADING_SUBMISSION_DEADLINE", 60))
+GRADING_BATCH = os.getenv("GRADING_BATCH", "0") == "1"
+GRADING_BATCH_TIMEOUT = float(os.getenv("GRADING_BATCH_TIMEOUT", 40))
+
+grading_executor = ThreadPoolExecutor(max_workers=GRADING_MAX_WORKERS, thread_name_prefix="grading")
+
+
 # ------------------------ AI Evaluation: Free Response Grading ------------------------
 # Function: evaluate_text_response_with_openai
 # Purpose:
 #   - Send user's text response to GPT model for evaluation
 #   - Prompt includes key concepts (keywords) and grading rubric
 #   - Extracts score from last line of model response
+#   - Returns (score, reasoning); reasoning is None when the call or score parsing
+#     failed, so the fallback 0 is never memoized in grading_cache
 # --------------------------------------------------------------------------------------
 def evaluate_text_response_with_openai(user_answer, keyword_list, max_points, question_text):
     try:
@@ -1084,11 +2656,13 @@ INSTRUCTIONS:
         print("---------------------------------------------------")
 
         # call OpenAI chat API with prompt
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-        )
+        with timed_stage("grading", "gpt-4o"):
+            response = client.chat.completions.create(
+                model="gpt-4o",
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.2,
+                timeout=GRADING_QUESTION_TIMEOUT,
+            )
 
         
         full_response = response.choices[0].message.content.strip()
@@ -1107,14 +2681,310 @@ INSTRUCTIONS:
         if matches:
             score = float(matches[0])  # grab the first valid number
         else:
-            score = 0  # fallback if parsing fails
+            return 0, None  # fallback if parsing fails
 
 
-        return max(0, min(score, max_points))  # bound to [0, max]
+        return max(0, min(score, max_points)), full_response  # bound to [0, max]
 
     except Exception as e:
         print(f"AI grading error: {e}")
-        return 0
+        return 0, None
+
+
+# ------------------------ AI Evaluation: Batch Grading ------------------------
+# Function: evaluate_text_responses_batch
+# Purpose:
+#   - Grade every pending free-response answer of a submission in one GPT-4o call
+#   - Rubric instructions are sent once; questions go in as a JSON list
+#   - The reply is constrained by a JSON schema (question_id, rationale, score)
+#   - Returns {question_id: (score, rationale)} only for items that validate:
+#     known question, numeric score within [0, max_points], non-empty rationale.
+#     Anything missing or invalid is left for per-question grading.
+# ------------------------------------------------------------------------------
+BATCH_GRADING_INSTRUCTIONS = """
+You are an education grading assistant. Your job is to grade short free-response student answers based on how well they address the key concepts of a specific question.
+
+You will receive a JSON list of questions. Each has a question_id, the question text, its keywords, the student's answer and max_points.
+
+For EVERY question return one grade with:
+- question_id: copied exactly from the input
+- rationale: which keywords or ideas were addressed and which were missing, and how well the student answered the question based on those key ideas
+- score: a number from 0 to that question's max_points
+"""
+
+BATCH_GRADING_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "grades": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question_id": {"type": "string"},
+                    "rationale": {"type": "string"},
+                    "score": {"type": "number"},
+                },
+                "required": ["question_id", "rationale", "score"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["grades"],
+    "additionalProperties": False,
+}
+
+
+def evaluate_text_responses_batch(pending):
+    """Grade {question_id: (answer, keywords, max_points, question_text)} in one call."""
+    try:
+        max_points_by_id = {q_id: max_points or 1 for q_id, (_, _, max_points, _) in pending.items()}
+        questions = [
+            {
+                "question_id": q_id,
+                "question": question_text,
+                "keywords": keyword_list,
+                "student_answer": user_answer,
+                "max_points": max_points_by_id[q_id],
+            }
+            for q_id, (user_answer, keyword_list, _, question_text) in pending.items()
+        ]
+        print(f"📝 AI batch grading {len(questions)} question(s)")
+
+        # single attempt: a retried batch would eat the per-question fallback's budget
+        batch_client = client.with_options(max_retries=0, timeout=GRADING_BATCH_TIMEOUT)
+        with timed_stage("grading", "gpt-4o"):
+            response = batch_client.chat.completions.create(
+                model="gpt-4o",
+                messages=[
+                    {"role": "system", "content": BATCH_GRADING_INSTRUCTIONS.strip()},
+                    {"role": "user", "content": json.dumps({"questions": questions}, indent=2)},
+                ],
+                temperature=0.2,
+                response_format={
+                    "type": "json_schema",
+                    "json_schema": {"name": "grades", "strict": True, "schema": BATCH_GRADING_SCHEMA},
+                },
+            )
+
+        grades = json.loads(response.choices[0].message.content)["grades"]
+    except Exception as e:
+        print(f"AI batch grading error: {e}")
+        return {}
+
+    # keep the first valid grade per requested question
+    results = {}
+    for grade in grades:
+        q_id = str(grade.get("question_id"))
+        score = grade.get("score")
+        rationale = grade.get("rationale")
+        if q_id not in max_points_by_id or q_id in results:
+            continue
+        if isinstance(score, bool) or not isinstance(score, (int, float)):
+            continue
+        if not 0 <= score <= max_points_by_id[q_id]:
+            continue
+        if not isinstance(rationale, str) or not rationale.strip():
+            continue
+        results[q_id] = (float(score), rationale.strip())
+
+    rejected = len(pending) - len(results)
+    if rejected:
+        print(f"AI batch grading: {rejected} item(s) failed validation, grading individually")
+    return results
+
+
+def grade_text_questions(pending):
+    """Grade pending text questions within GRADING_SUBMISSION_DEADLINE.
+
+    Batch-grades first (when enabled), then runs per-question calls for whatever
+    the batch did not return. Returns {question_id: (score, reasoning)}; reasoning
+    is None for questions that could not be graded in time (scored 0).
+    """
+    deadline = time.monotonic() + GRADING_SUBMISSION_DEADLINE
+    grades = {}
+
+    if GRADING_BATCH and pending:
+        batch_future = submit_in_route(grading_executor, evaluate_text_responses_batch, pending)
+        done, _ = wait([batch_future], timeout=min(GRADING_BATCH_TIMEOUT, max(0, deadline - time.monotonic())))
+        if done:
+            grades.update(batch_future.result())
+        else:
+            batch_future.cancel()
+
+    grading_futures = {
+        q_id: submit_in_route(grading_executor, evaluate_text_response_with_openai, *args)
+        for q_id, args in pending.items() if q_id not in grades
+    }
+
+    # wait for the remaining questions, bounded by the per-submission deadline
+    if grading_futures:
+        _, not_done = wait(grading_futures.values(), timeout=max(0, deadline - time.monotonic()))
+        for future in not_done:
+            future.cancel()
+        if not_done:
+            print(f"AI grading deadline exceeded: {len(not_done)} question(s) scored 0")
+
+    for q_id, future in grading_futures.items():
+        grades[q_id] = future.result() if future.done() and not future.cancelled() else (0, None)
+    return grades
+
+
+# ------------------------ AI Grading Cache ------------------------
+# Grades for free-response answers are memoized in the grading_cache table, shared
+# by every worker and surviving restarts. A cache key covers the question version,
+# rubric keywords, max_points and the normalized answer; the question_id is stored
+# alongside it. Editing a question's rubric bumps assignment_questions.question_version
+# and clears its cached grades (see trigger in TutorTech_db_demo.sql).
+# -----------------------------------------------------------------
+def grading_cache_key(question, user_answer):
+    keyword_list = question['correct_answer'] if isinstance(question['correct_answer'], list) else []
+    normalized_answer = " ".join((user_answer or "").casefold().split())
+    raw_key = json.dumps([
+        question['question_version'],
+        keyword_list,
+        question['max_points'],
+        normalized_answer
+    ])
+    return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+
+
+def fetch_cached_grades(cur, keys_by_question):
+    """Return {question_id: score} for cached (question_id, cache_key) pairs."""
+    if not keys_by_question:
+        return {}
+    cur.execute("""
+        SELECT question_id, score
+        FROM grading_cache
+        WHERE (question_id, cache_key) IN %s
+    """, (tuple((int(q_id), key) for q_id, key in keys_by_question.items()),))
+    return {str(row['question_id']): float(row['score']) for row in cur.fetchall()}
+
+
+def store_cached_grades(cur, entries):
+    """Insert (question_id, question_version, cache_key, score, reasoning) rows in one statement."""
+    if not entries:
+        return
+    psycopg2.extras.execute_values(cur, """
+        INSERT INTO grading_cache (question_id, question_version, cache_key, score, reasoning)
+        VALUES %s
+        ON CONFLICT (question_id, cache_key) DO NOTHING;
+    """, entries, page_size=len(entries))
+
+
+# ------------------------ Per-User Progress Rollups ------------------------
+# user_course_progress holds one row per (user, course): completed_count, total_count,
+# score_sum and max_sum. It is maintained incrementally in the same transaction as
+# the grades upsert (submit_assignment) and enrollment (enroll_course), so progress,
+# completion counts and course averages are single indexed lookups.
+# The columns keep the grouping of the queries they replace:
+#   - completed_count / total_count: by the catalog course of the assignment
+#     (course_modules.course_code), as progress and completion counts always were
+#   - score_sum / max_sum: by grades.course_code, as course averages always were
+# The one difference: a (user, course) pair is counted once even if enrollments
+# holds it twice (/enroll refuses repeats, so only races or manual inserts do).
+# After editing the assignment catalog run:
+#   flask --app app rebuild-progress-rollups
+# ---------------------------------------------------------------------------
+def update_progress_rollup(cur, user_id, assignment_id, course_code, previous_grade, score, max_score):
+    """Apply the change from previous_grade (row or None) to a new score to the rollup."""
+    completed_delta = 0 if previous_grade and previous_grade['score'] is not None else 1
+    score_delta = score - float(previous_grade['score'] or 0) if previous_grade else score
+    max_delta = max_score - float(previous_grade['max_score'] or 0) if previous_grade else max_score
+    # the grades upsert keeps the course_code of the first submission
+    graded_course_code = previous_grade['course_code'] if previous_grade else course_code
+
+    cur.execute("""
+        WITH deltas AS (
+            -- completion against the assignment's catalog course
+            SELECT cm.course_code, %(completed)s AS completed_delta, 0 AS score_delta, 0 AS max_delta
+            FROM course_assignments ca
+            JOIN course_modules cm ON ca.module_id = cm.id
+            WHERE ca.assignment_id = %(assignment_id)s
+            UNION ALL
+            -- scores against the course code stored on the grade
+            SELECT %(graded_course_code)s, 0, %(score)s, %(max)s
+        )
+        INSERT INTO user_course_progress
+            (user_id, course_code, enrolled, completed_count, total_count, score_sum, max_sum)
+        SELECT
+            %(user_id)s, d.course_code, FALSE, SUM(d.completed_delta),
+            (SELECT COUNT(*) FROM course_assignments all_ca
+             JOIN course_modules all_cm ON all_ca.module_id = all_cm.id
+             WHERE all_cm.course_code = d.course_code),
+            SUM(d.score_delta), SUM(d.max_delta)
+        FROM deltas d
+        GROUP BY d.course_code          -- one row when both keys name the same course
+        ON CONFLICT (user_id, course_code) DO UPDATE SET
+            completed_count = user_course_progress.completed_count + EXCLUDED.completed_count,
+            score_sum = user_course_progress.score_sum + EXCLUDED.score_sum,
+            max_sum = user_course_progress.max_sum + EXCLUDED.max_sum;
+    """, {
+        "user_id": user_id, "assignment_id": assignment_id, "graded_course_code": graded_course_code,
+        "completed": completed_delta, "score": score_delta, "max": max_delta,
+    })
+
+
+def rebuild_progress_rollups(conn):
+    """Recompute every user_course_progress row from enrollments, grades and the catalog."""
+    with conn.cursor() as cur:
+        cur.execute("LOCK TABLE user_course_progress IN EXCLUSIVE MODE")
+        cur.execute("DELETE FROM user_course_progress")
+        cur.execute("""
+            WITH course_totals AS (
+                SELECT cm.course_code, COUNT(ca.assignment_id) AS total_count
+                FROM course_modules cm
+                LEFT JOIN course_assignments ca ON ca.module_id = cm.id
+                GROUP BY cm.course_code
+            ),
+            completed AS (
+                SELECT g.user_id, cm.course_code, COUNT(*) AS completed_count
+                FROM grades g
+                JOIN course_assignments ca ON ca.assignment_id = g.assignment_id
+                JOIN course_modules cm ON ca.module_id = cm.id
+                WHERE g.score IS NOT NULL
+                GROUP BY g.user_id, cm.course_code
+            ),
+            scored AS (
+                SELECT user_id, course_code, SUM(score) AS score_sum, SUM(max_score) AS max_sum
+                FROM grades
+                GROUP BY user_id, course_code
+            ),
+            pairs AS (
+                SELECT user_id, course_code FROM enrollments
+                UNION
+                SELECT user_id, course_code FROM completed
+                UNION
+                SELECT user_id, course_code FROM scored
+            )
+            INSERT INTO user_course_progress
+                (user_id, course_code, enrolled, completed_count, total_count, score_sum, max_sum)
+            SELECT
+                p.user_id,
+                p.course_code,
+                EXISTS (SELECT 1 FROM enrollments e WHERE e.user_id = p.user_id AND e.course_code = p.course_code),
+                COALESCE(co.completed_count, 0),
+                COALESCE(ct.total_count, 0),
+                COALESCE(sc.score_sum, 0),
+                COALESCE(sc.max_sum, 0)
+            FROM pairs p
+            LEFT JOIN completed co ON co.user_id = p.user_id AND co.course_code = p.course_code
+            LEFT JOIN scored sc ON sc.user_id = p.user_id AND sc.course_code = p.course_code
+            LEFT JOIN course_totals ct ON ct.course_code = p.course_code;
+        """)
+        rows = cur.rowcount
+    conn.commit()
+    return rows
+
+
+@bp.cli.command("rebuild-progress-rollups")
+def rebuild_progress_rollups_command():
+    """Recompute user_course_progress from scratch."""
+    conn = get_db_connection()
+    try:
+        rows = rebuild_progress_rollups(conn)
+        print(f"Rebuilt {rows} progress rollup rows.")
+    finally:
+        conn.close()
 
 
 # ----------------------------- Submit Assignment Answers -----------------------------
@@ -1126,7 +2996,7 @@ INSTRUCTIONS:
 #   - Store per-question results in assignment_results
 #   - Use OpenAI for grading free response (text) questions
 # -------------------------------------------------------------------------------------
-@app.route('/api/assignments/<assignment_id>/submit', methods=['POST'])
+@bp.route('/api/assignments/<assignment_id>/submit', methods=['POST'])
 def submit_assignment(assignment_id):
     # extract POSTed JSON values
     user_id = request.json.get('user_id')
@@ -1140,31 +3010,57 @@ def submit_assignment(assignment_id):
             raise Exception("Failed to get database connection")
 
         # fetch assignment questions
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with timed_stage("db_query"), conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("""
-                SELECT question_id, question_text, question_type, options, correct_answer, max_points
+                SELECT question_id, question_text, question_type, options, correct_answer, max_points,
+                       question_version
                 FROM assignment_questions
                 WHERE assignment_id = %s
             """, (assignment_id,))
             questions = cur.fetchall()
 
-        # grade each question individually
+            # look up previously graded identical answers in one query
+            cache_keys = {
+                str(question['question_id']): grading_cache_key(question, user_answers.get(str(question['question_id'])))
+                for question in questions if question['question_type'] == 'text'
+            }
+            cached_scores = fetch_cached_grades(cur, cache_keys)
+
+        # -------- AI evaluation for free-response questions --------
+        pending_text = {}
+        for question in questions:
+            if question['question_type'] == 'text' and str(question['question_id']) not in cached_scores:
+                q_id = str(question['question_id'])
+                correct_answer = question['correct_answer']
+                # Expecting keyword array
+                keyword_list = correct_answer if isinstance(correct_answer, list) else []
+                pending_text[q_id] = (
+                    user_answers.get(q_id) or "",
+                    keyword_list,
+                    question['max_points'],
+                    question['question_text']
+                )
+        ai_grades = grade_text_questions(pending_text)
+
+        # grade each question individually (in original question order)
+        new_cache_entries = []
         for question in questions:
             q_id = str(question['question_id'])
             user_answer = user_answers.get(q_id)
             correct_answer = question['correct_answer']
             max_points = question['max_points']
 
-            # -------- handle AI evaluation for free-response questions --------
+            # -------- collect AI evaluation for free-response questions --------
             if question['question_type'] == 'text':
-                # Expecting keyword array
-                keyword_list = correct_answer if isinstance(correct_answer, list) else []
-                points_awarded = evaluate_text_response_with_openai(
-                    user_answer or "", 
-                    keyword_list, 
-                    max_points,
-                    question['question_text']
-                )
+                if q_id in cached_scores:
+                    points_awarded = cached_scores[q_id]
+                else:
+                    points_awarded, reasoning = ai_grades[q_id]
+                    if reasoning is not None:
+                        new_cache_entries.append((
+                            question['question_id'], question['question_version'],
+                            cache_keys[q_id], points_awarded, reasoning
+                        ))
                 is_correct = points_awarded > 0 # partial credit allowed
             else:
                 # normal comparison for multiple_choice, true_false
@@ -1186,44 +3082,68 @@ def submit_assignment(assignment_id):
         total_score = sum(res['points_awarded'] for res in results)
         total_possible = sum(res['max_points'] for res in results)
 
-        # ---------- Save Overall Score to grades ----------
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO grades (user_id, assignment_id, course_code, score, max_score)
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (user_id, assignment_id)
-                DO UPDATE SET score = EXCLUDED.score, max_score = EXCLUDED.max_score;
-            """, (user_id, assignment_id, course_code, total_score, total_possible))
-
-        # ---------- Save Per-Question Results ----------
-        with conn.cursor() as cur:
-            for res in results:
+        with timed_stage("db_write"):
+            # ---------- Save Overall Score to grades ----------
+            with conn.cursor() as cur:
+                # serialize concurrent submissions of the same assignment by the same user
+                cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"{user_id}:{assignment_id}",))
+                # upsert and read the replaced score in one round trip; CTEs see the pre-upsert row
                 cur.execute("""
-                    INSERT INTO assignment_results (
-                        user_id, assignment_id, question_id, user_answer,
-                        points_awarded, max_points, correct, correct_answer
+                    WITH previous AS (
+                        SELECT score, max_score, course_code FROM grades
+                        WHERE user_id = %s AND assignment_id = %s
+                    ), upserted AS (
+                        INSERT INTO grades (user_id, assignment_id, course_code, score, max_score)
+                        VALUES (%s, %s, %s, %s, %s)
+                        ON CONFLICT (user_id, assignment_id)
+                        DO UPDATE SET score = EXCLUDED.score, max_score = EXCLUDED.max_score
                     )
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (user_id, assignment_id, question_id)
-                    DO UPDATE SET
-                        user_answer = EXCLUDED.user_answer,
-                        points_awarded = EXCLUDED.points_awarded,
-                        max_points = EXCLUDED.max_points,
-                        correct = EXCLUDED.correct,
-                        correct_answer = EXCLUDED.correct_answer;
-                """, (
-                    user_id,
-                    assignment_id,
-                    res["question_id"],
-                    res["user_answer"],
-                    res["points_awarded"],
-                    res["max_points"],
-                    res["correct"],
-                    json.dumps(res["correct_answer"])
-                ))
-
-        # Commit all changes
-        conn.commit()
+                    SELECT score, max_score, course_code FROM previous;
+                """, (user_id, assignment_id, user_id, assignment_id, course_code, total_score, total_possible))
+                previous_grade = cur.fetchone()
+
+                # ---------- Update Progress Rollup ----------
+                update_progress_rollup(
+                    cur, user_id, assignment_id, course_code, previous_grade, total_score, total_possible
+                )
+
+            # ---------- Save Per-Question Results ----------
+            # one multi-row INSERT regardless of question count
+            if results:
+                with conn.cursor() as cur:
+                    psycopg2.extras.execute_values(cur, """
+                        INSERT INTO assignment_results (
+                            user_id, assignment_id, question_id, user_answer,
+                            points_awarded, max_points, correct, correct_answer
+                        )
+                        VALUES %s
+                        ON CONFLICT (user_id, assignment_id, question_id)
+                        DO UPDATE SET
+                            user_answer = EXCLUDED.user_answer,
+                            points_awarded = EXCLUDED.points_awarded,
+                            max_points = EXCLUDED.max_points,
+                            correct = EXCLUDED.correct,
+                            correct_answer = EXCLUDED.correct_answer;
+                    """, [
+                        (
+                            user_id,
+                            assignment_id,
+                            res["question_id"],
+                            res["user_answer"],
+                            res["points_awarded"],
+                            res["max_points"],
+                            res["correct"],
+                            json.dumps(res["correct_answer"])
+                        )
+                        for res in results
+                    ], page_size=len(results))
+
+            # ---------- Memoize New AI Grades ----------
+            with conn.cursor() as cur:
+                store_cached_grades(cur, new_cache_entries)
+
+            # Commit all changes
+            conn.commit()
         return jsonify({"results": results, "total_score": total_score}), 200
 
     except Exception as e:
@@ -1243,7 +3163,7 @@ def submit_assignment(assignment_id):
 # Purpose:
 #   - Return previously submitted answers and scores for a given user/assignment
 # -------------------------------------------------------------------------------------
-@app.route('/api/assignments/<assignment_id>/results', methods=['GET'])
+@bp.route('/api/assignments/<assignment_id>/results', methods=['GET'])
 def get_assignment_results(assignment_id):
     user_id = request.args.get('user_id')
 
@@ -1278,7 +3198,7 @@ def get_assignment_results(assignment_id):
 #   - Include course title and module info
 #   - Add computed course_average per assignment row
 # -----------------------------------------------------------------------------------
-@app.route('/api/grades/<user_id>', methods=['GET'])
+@bp.route('/api/grades/<user_id>', methods=['GET'])
 def get_grades(user_id):
     try:
         # ----------------------- Connect and create cursor -----------------------
@@ -1318,16 +3238,15 @@ def get_grades(user_id):
 
         # ----------------------- Fetch total scores per course -----------------------
         course_totals_query = """
-        -- Get total points earned and total points possible per course for this user
+        -- Total points earned and total points possible per course, from the progress rollup
+
+        SELECT
+            course_code,                           -- One row per course
+            score_sum AS total_score,             -- Total points the student earned across assignments
+            max_sum AS total_max                  -- Total possible points across those assignments
+        FROM user_course_progress
+        WHERE user_id = %s;                        -- Only include this user's rollups
 
-        SELECT 
-            course_code,                           -- Group results by course
-            SUM(score) AS total_score,            -- Total points the student earned across assignments
-            SUM(max_score) AS total_max           -- Total possible points across those assignments
-        FROM grades
-        WHERE user_id = %s                         -- Only include this user's grades
-        GROUP BY course_code;                      -- One row per course
-        
         """
         cursor.execute(course_totals_query, (user_id,))
         totals = cursor.fetchall() # aggregate scores per course
@@ -1360,6 +3279,104 @@ def get_grades(user_id):
             conn.close()
 
 
+# ----------------------------- Get Dashboard Data for User -----------------------------
+# Route: /api/dashboard/<user_id>
+# Method: GET
+# Purpose:
+#   - Return everything the dashboard needs in one round trip:
+#       enrolled_courses   (same as /enrolled-courses/<user_id>)
+#       course_progress    (same as /api/course-progress/<user_id>)
+#       completion_counts  (same as /api/completion-counts/<user_id>)
+#       grades             (same as /api/grades/<user_id>)
+#   - Uses one connection and three queries; progress, completion counts and course
+#     averages come from the user's user_course_progress rows, like the endpoints above
+# ---------------------------------------------------------------------------------------
+@bp.route('/api/dashboard/<user_id>', methods=['GET'])
+def get_dashboard(user_id):
+    try:
+        # ----------------------- Connect and create cursor -----------------------
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+        # ----------------------- Enrolled courses -----------------------
+        cursor.execute("""
+            SELECT ci.course_code, ci.course_title, ci.credits
+            FROM course_information ci
+            JOIN enrollments e ON ci.course_code = e.course_code
+            WHERE e.user_id = %s
+        """, (user_id,))
+        enrolled_courses = cursor.fetchall()
+
+        # ----------------------- Every assignment with the user's grade -----------------------
+        cursor.execute("""
+        SELECT
+            ca.assignment_id,
+            ca.assignment_title,
+            cm.course_code,
+            c.course_title,
+            g.score,
+            g.max_score,
+            cm.module_sequence,
+            cm.module_title
+        FROM course_assignments ca
+        JOIN course_modules cm ON ca.module_id = cm.id
+        JOIN course_information c ON cm.course_code = c.course_code
+        LEFT JOIN grades g ON ca.assignment_id = g.assignment_id AND g.user_id = %s
+        ORDER BY cm.module_sequence, ca.assignment_title;
+        """, (user_id,))
+        grades = cursor.fetchall()
+
+        # ----------------------- Progress rollups -----------------------
+        cursor.execute("""
+        SELECT
+            course_code,
+            enrolled,
+            completed_count,
+            total_count,
+            score_sum,
+            max_sum,
+            CASE WHEN enrolled AND total_count > 0
+                 THEN ROUND((completed_count::numeric / total_count) * 100, 2)
+            END AS progress
+        FROM user_course_progress
+        WHERE user_id = %s;
+        """, (user_id,))
+        rollups = cursor.fetchall()
+
+        course_progress = [
+            {"course_code": row['course_code'], "progress": row['progress']}
+            for row in rollups if row['progress'] is not None
+        ]
+
+        completion_counts = {
+            "completed": sum(row['completed_count'] for row in rollups if row['enrolled']),
+            "total": sum(row['total_count'] for row in rollups if row['enrolled'])
+        }
+
+        course_averages = {
+            row['course_code']: round((row['score_sum'] / row['max_sum']) * 100, 2)
+            for row in rollups if row['max_sum'] > 0
+        }
+        for row in grades:
+            course_code = row.get('course_code')
+            row['course_average'] = float(course_averages[course_code]) if course_code in course_averages else None
+
+        return jsonify({
+            "enrolled_courses": enrolled_courses,
+            "course_progress": course_progress,
+            "completion_counts": completion_counts,
+            "grades": grades
+        }), 200
+
+    except Exception as e:
+        print(f"Error fetching dashboard: {e}")
+        return jsonify({"error": "Failed to fetch dashboard"}), 500
+
+    finally:
+        if conn:
+            conn.close()
+
+
 # ----------------------------- Get Course Progress by User -----------------------------
 # Route: /api/course-progress/<user_id>
 # Method: GET
@@ -1367,7 +3384,7 @@ def get_grades(user_id):
 #   - Calculate percentage of completed assignments per course for a given user
 #   - Progress = (completed assignments / total assignments) * 100
 # ---------------------------------------------------------------------------------------
-@app.route('/api/course-progress/<user_id>', methods=['GET'])
+@bp.route('/api/course-progress/<user_id>', methods=['GET'])
 def course_progress(user_id):
 
     # ----------------------- Connect and create cursor -----------------------
@@ -1376,37 +3393,20 @@ def course_progress(user_id):
 
     # ----------------------- Progress query per course -----------------------
     cursor.execute("""
-    -- Calculate how much of each course the user has completed, based on graded assignments
-    
+    -- Completion percentage per enrolled course, read from the progress rollup
+
     SELECT
-        c.course_code,                                              -- Course identifier
+        course_code,                                                -- Course identifier
         ROUND(                                                      -- Round the percentage to 2 decimal places
-            ( 
-              COUNT(CASE WHEN g.score IS NOT NULL THEN 1 END)::numeric  -- Count only assignments that have a score
-              / 
-              COUNT(ca.assignment_id)                               -- Total number of assignments in the course
-            ) * 100,
+            (completed_count::numeric / total_count) * 100,         -- Graded assignments / assignments in the course
             2
         ) AS progress                                               -- Final result percentage :of assignments completed
-    FROM course_information c
-                   
-    -- Link user enrollments to the course
-    JOIN enrollments e ON c.course_code = e.course_code
-                   
-    -- Get all modules for that course
-    JOIN course_modules cm ON cm.course_code = c.course_code
-                   
-    -- Get all assignments in those modules
-    JOIN course_assignments ca ON ca.module_id = cm.id
-                   
-    -- Include grades (may be NULL if not graded yet)
-    LEFT JOIN grades g ON g.assignment_id = ca.assignment_id AND g.user_id = %s
-                   
-    -- Only consider courses the user is enrolled in
-    WHERE e.user_id = %s
-    GROUP BY c.course_code;
-
-    """, (user_id, user_id))
+    FROM user_course_progress
+    WHERE user_id = %s
+      AND enrolled                                                  -- Only consider courses the user is enrolled in
+      AND total_count > 0;                                          -- Courses without assignments have no progress
+
+    """, (user_id,))
     data = cursor.fetchall()
     conn.close()
 
@@ -1421,7 +3421,7 @@ def course_progress(user_id):
 #   - Return a summary count of completed and total assignments
 #   - Used for pie charts and dashboard analysis
 # -----------------------------------------------------------------------------------------
-@app.route('/api/completion-counts/<user_id>', methods=['GET'])
+@bp.route('/api/completion-counts/<user_id>', methods=['GET'])
 def completion_counts(user_id):
     try:
         # ----------------------- Connect and create cursor -----------------------
@@ -1430,27 +3430,17 @@ def completion_counts(user_id):
 
         # ----------------------- Count completed vs total assignments -----------------------
         query = """
-        -- Count how many total assignments exist and how many have been completed (graded) for this user
-        
-        SELECT
-            COUNT(*) FILTER (WHERE g.score IS NOT NULL) AS completed,   -- Only count assignments with a non-null score
-            COUNT(*) AS total                                            -- Count all assignments the user should complete
-        FROM course_assignments ca
-
-        -- Link each assignment to its module
-        JOIN course_modules cm ON ca.module_id = cm.id
+        -- Sum completed (graded) and total assignments over the user's enrolled courses
 
-        -- Only include assignments in courses the user is enrolled in
-        JOIN enrollments e ON cm.course_code = e.course_code
-
-        -- Link grades to the current user
-        LEFT JOIN grades g ON g.assignment_id = ca.assignment_id AND g.user_id = %s
-
-        -- Only include courses the user is enrolled in
-        WHERE e.user_id = %s;
+        SELECT
+            COALESCE(SUM(completed_count), 0) AS completed,   -- Assignments with a score
+            COALESCE(SUM(total_count), 0) AS total            -- All assignments the user should complete
+        FROM user_course_progress
+        WHERE user_id = %s
+          AND enrolled;                                       -- Only include courses the user is enrolled in
 
         """
-        cursor.execute(query, (user_id, user_id))
+        cursor.execute(query, (user_id,))
         result = cursor.fetchone()
         conn.close()
         return jsonify(result)
@@ -1461,5 +3451,24 @@ def completion_counts(user_id):
         return jsonify({"error": "Failed to fetch data"}), 500
 
 
+# ------------------------ Application Factory ------------------------
+def create_app(bootstrap=False):
+    """Build the Flask app. bootstrap=True also provisions Qdrant (see Lazy Clients)."""
+    # Allow requests from the frontend with credentials (for cookies)
+    app = Flask(__name__)
+
+    # Enable CORS for the app (Hopefully this will fix cors issues)
+    CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
+
+    app.register_blueprint(bp)
+    if bootstrap:
+        bootstrap_qdrant()
+    return app
+
+
+# module-level app for `gunicorn app:app` and `flask --app app`
+app = create_app()
+
 if __name__ == "__main__":
+    bootstrap_qdrant()
     app.run(port=5000, debug=True)
\ No newline at end of file
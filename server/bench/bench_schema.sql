@@ -0,0 +1,72 @@
+--------------------------------------------------------------------------------------------------------------
+-- Benchmark seed: brings a database loaded from TutorTech_db_demo_FIXED.sql up to the schema the server
+-- queries today (modules, assignment results), then adds bench students. Applied by bench/load_test.py,
+-- followed by sections (11)-(13) of TutorTech_db_demo.sql.
+--------------------------------------------------------------------------------------------------------------
+
+---------------------------- (1) One module per course  --------------------------
+CREATE TABLE course_modules (
+    id SERIAL PRIMARY KEY,
+    course_code VARCHAR(10) NOT NULL,
+    module_sequence INT NOT NULL,
+    module_title VARCHAR(100) NOT NULL,
+    module_description TEXT,
+
+    CONSTRAINT uq_course_module UNIQUE (course_code, module_sequence),
+    CONSTRAINT fk_course FOREIGN KEY (course_code)
+        REFERENCES course_information (course_code)
+        ON DELETE CASCADE
+);
+
+INSERT INTO course_modules (course_code, module_sequence, module_title, module_description)
+SELECT course_code, 1, 'Module 1', 'Introduction to ' || course_title
+FROM course_information;
+
+---------------------------- (2) Lectures and assignments belong to modules  --------------------------
+ALTER TABLE course_lectures ADD COLUMN module_id INT, ADD COLUMN sequence_number INT;
+UPDATE course_lectures cl SET module_id = cm.id, sequence_number = 1
+FROM course_modules cm WHERE cm.course_code = cl.course_code;
+ALTER TABLE course_lectures
+    DROP CONSTRAINT course_code,
+    DROP COLUMN course_code,
+    ADD CONSTRAINT fk_lecture_module FOREIGN KEY (module_id) REFERENCES course_modules (id) ON DELETE CASCADE,
+    ADD CONSTRAINT uq_lecture_sequence UNIQUE (module_id, sequence_number);
+
+ALTER TABLE course_assignments ADD COLUMN module_id INT, ADD COLUMN sequence_number INT;
+UPDATE course_assignments ca SET module_id = cm.id, sequence_number = 1
+FROM course_modules cm WHERE cm.course_code = ca.course_code;
+ALTER TABLE course_assignments
+    DROP CONSTRAINT course_code,
+    DROP COLUMN course_code,
+    ADD CONSTRAINT fk_assignment_module FOREIGN KEY (module_id) REFERENCES course_modules (id) ON DELETE CASCADE,
+    ADD CONSTRAINT uq_assignment_sequence UNIQUE (module_id, sequence_number);
+
+---------------------------- (3) Assignment results  --------------------------
+CREATE TABLE IF NOT EXISTS assignment_results (
+    user_id VARCHAR(50) NOT NULL,
+    assignment_id VARCHAR(10) NOT NULL,
+    question_id INT NOT NULL,
+    user_answer TEXT,
+    points_awarded INT,
+    max_points INT,
+    correct BOOLEAN,
+    correct_answer JSONB,
+    PRIMARY KEY (user_id, assignment_id, question_id),
+    FOREIGN KEY (user_id) REFERENCES student_information(user_id) ON DELETE CASCADE,
+    FOREIGN KEY (assignment_id) REFERENCES course_assignments(assignment_id) ON DELETE CASCADE,
+    FOREIGN KEY (question_id) REFERENCES assignment_questions(question_id) ON DELETE CASCADE
+);
+
+---------------------------- (4) Bench students  --------------------------
+-- bench001..bench200, each enrolled in every course; every fourth one uses the Custom bot preferences
+INSERT INTO student_information (user_id, first_name, last_name, email, user_password, learning_preferences)
+SELECT 'bench' || LPAD(i::text, 3, '0'), 'Bench', 'Student ' || i, 'bench' || i || '@example.com', 'benchPass',
+       CASE WHEN i % 4 = 0
+            THEN '{"response_length": "short", "guidance_style": "step_by_step", "value_focus": "process"}'
+       END
+FROM generate_series(1, 200) AS i;
+
+INSERT INTO enrollments (user_id, course_code)
+SELECT s.user_id, c.course_code
+FROM student_information s CROSS JOIN course_information c
+WHERE s.user_id LIKE 'bench%';
@@ -0,0 +1,191 @@
+"""
+Stand-in for the OpenAI API used by the benchmarks.
+
+Serves the two endpoints the server calls, with fixed latency and
+deterministic output so runs are comparable and cost nothing:
+    POST /v1/embeddings         -> 1536-d unit vectors derived from sha256(text)
+    POST /v1/chat/completions   -> a fixed-length answer, streamed or not;
+                                   grading prompts get a final score line and
+                                   json_schema batch grading requests get a
+                                   {"grades": [...]} object
+
+Point the server at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+Usage (from the server/ directory):
+    python bench/fake_openai.py --port 8099
+    python bench/fake_openai.py --chat-latency 0.8 --token-latency 0.01 --tokens 150
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+EMBEDDING_DIMENSIONS = 1536
+WORDS = (
+    "measurement calibration uncertainty traceability standard instrument accuracy precision "
+    "process control variation experiment factor response signal noise resolution reference"
+).split()
+SCORE_PATTERN = re.compile(r"numeric score from 0 to (\d+)")
+
+
+def fake_embedding(text):
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    vector = [rng.gauss(0, 1) for _ in range(EMBEDDING_DIMENSIONS)]
+    norm = sum(v * v for v in vector) ** 0.5
+    return [v / norm for v in vector]
+
+
+def fake_batch_grades(prompt, tokens):
+    """Deterministic {"grades": [...]} reply for a batch grading request."""
+    rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+    return {"grades": [
+        {
+            "question_id": question["question_id"],
+            "rationale": " ".join(rng.choice(WORDS) for _ in range(tokens)),
+            "score": rng.randint(0, int(question["max_points"])),
+        }
+        for question in json.loads(prompt)["questions"]
+    ]}
+
+
+def fake_answer(prompt, tokens):
+    """Deterministic answer text; grading prompts end with a score line."""
+    rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+    words = [rng.choice(WORDS) for _ in range(tokens)]
+    match = SCORE_PATTERN.search(prompt)
+    if match:
+        max_points = int(match.group(1))
+        words.append(f"\n{rng.randint(0, max_points)}")
+    return words
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass   # keep benchmark output readable
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        if self.path.endswith("/embeddings"):
+            self.handle_embeddings(request)
+        elif self.path.endswith("/chat/completions"):
+            self.handle_chat(request)
+        else:
+            self._send_json({"error": {"message": f"unknown path {self.path}"}}, 404)
+
+    def handle_embeddings(self, request):
+        inputs = request["input"]
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        time.sleep(self.server.embedding_latency)
+        self._send_json({
+            "object": "list",
+            "model": request.get("model"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(text)}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+    def handle_chat(self, request):
+        prompt = request["messages"][-1]["content"]
+        if (request.get("response_format") or {}).get("type") == "json_schema":
+            # one rationale per question; spread the answer budget across them
+            questions = len(json.loads(prompt)["questions"])
+            words = [json.dumps(fake_batch_grades(prompt, max(1, self.server.tokens // questions)))]
+            time.sleep(self.server.token_latency * self.server.tokens)
+        else:
+            words = fake_answer(prompt, self.server.tokens)
+        completion_id = f"chatcmpl-{hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]}"
+        base = {"id": completion_id, "created": int(time.time()), "model": request.get("model")}
+
+        time.sleep(self.server.chat_latency)   # time to first token
+        if not request.get("stream"):
+            time.sleep(self.server.token_latency * len(words))
+            self._send_json({
+                **base,
+                "object": "chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": " ".join(words)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(words), "total_tokens": len(words)},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send_event(data):
+            payload = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(payload):x}\r\n".encode("ascii") + payload + b"\r\n")
+            self.wfile.flush()
+
+        for i, word in enumerate(words):
+            delta = {"content": word if i == 0 else " " + word}
+            send_event(json.dumps({
+                **base,
+                "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+            }))
+            time.sleep(self.server.token_latency)
+        send_event(json.dumps({
+            **base,
+            "object": "chat.completion.chunk",
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }))
+        send_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def make_server(host="127.0.0.1", port=8099, chat_latency=0.5, token_latency=0.005,
+                embedding_latency=0.05, tokens=120):
+    server = ThreadingHTTPServer((host, port), FakeOpenAIHandler)
+    server.daemon_threads = True
+    server.chat_latency = chat_latency
+    server.token_latency = token_latency
+    server.embedding_latency = embedding_latency
+    server.tokens = tokens
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--chat-latency", type=float, default=0.5, help="seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="seconds per generated token")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="seconds per embeddings call")
+    parser.add_argument("--tokens", type=int, default=120, help="tokens per chat answer")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.chat_latency, args.token_latency,
+                         args.embedding_latency, args.tokens)
+    print(f"Fake OpenAI listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
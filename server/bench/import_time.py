@@ -0,0 +1,84 @@
+"""
+Import-time budget for server/app.py.
+
+Imports the module in fresh interpreters with Qdrant, OpenAI and Postgres
+pointed at an unroutable address, so any network call made at import time
+shows up as a stall, and fails when the median import exceeds --budget.
+With --profile, also lists the slowest imports from `python -X importtime`.
+
+Usage (from the server/ directory):
+    python bench/import_time.py
+    python bench/import_time.py --runs 10 --budget 1.5 --profile
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UNROUTABLE = "10.255.255.1"
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+
+
+def import_env():
+    return dict(
+        os.environ,
+        OPENAI_API_KEY="import-time",
+        SECRET_KEY="import-time",
+        OPENAI_BASE_URL=f"http://{UNROUTABLE}/v1",
+        QDRANT_HOST=f"http://{UNROUTABLE}:6333",
+        DB_HOST=UNROUTABLE,
+    )
+
+
+def time_import(timeout):
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=SERVER_DIR, env=import_env(), capture_output=True, text=True, timeout=timeout
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import app failed:\n{result.stderr}")
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(limit):
+    """(cumulative seconds, module) for the slowest imports, from -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=SERVER_DIR, env=import_env(), capture_output=True, text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, module = line.split("|")
+        rows.append((int(cumulative_us) / 1e6, module.rstrip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=3.0, help="seconds allowed for the median import")
+    parser.add_argument("--profile", action="store_true", help="list the slowest imports")
+    args = parser.parse_args()
+
+    # anything slower than a few budgets is a network stall, not a slow import
+    timings = [time_import(timeout=args.budget * 5) for _ in range(args.runs)]
+    median = statistics.median(timings)
+    print(f"import app: median {median:.3f}s, min {min(timings):.3f}s, max {max(timings):.3f}s "
+          f"over {args.runs} runs (budget {args.budget:.3f}s)")
+
+    if args.profile:
+        for seconds, module in slowest_imports(15):
+            print(f"{seconds:8.3f}s  {module}")
+
+    if median > args.budget:
+        print("FAIL: import-time budget exceeded")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
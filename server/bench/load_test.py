@@ -0,0 +1,365 @@
+"""
+Offline load test for the TutorTech server.
+
+Runs the real Flask app (under gunicorn) with every paid or hosted dependency
+replaced by a local stand-in:
+    OpenAI    -> bench/fake_openai.py (fixed latency, deterministic output)
+    Qdrant    -> in-memory instance inside each worker (QDRANT_HOST=:memory:)
+    Postgres  -> a throwaway database created on --pg-dsn and seeded from
+                 TutorTech_db_demo_FIXED.sql + bench/bench_schema.sql +
+                 sections (11)-(13) of TutorTech_db_demo.sql; dropped afterwards
+then drives a weighted mix of /api/chat, /api/assignments/<id>/submit and
+/api/dashboard/<user_id> from --concurrency client threads and reports
+p50/p95/p99 latency and requests per second per endpoint.
+
+With more than one gunicorn worker each worker has its own in-memory Qdrant,
+so chat history is only shared between requests that land on the same worker.
+
+Usage (from the server/ directory):
+    python bench/load_test.py --pg-dsn "host=localhost user=postgres dbname=postgres"
+    python bench/load_test.py --duration 60 --concurrency 32 --workers 2 --threads 16
+    python bench/load_test.py --mix chat=1 --stream --chat-latency 0.8
+    python bench/load_test.py --mix submit=3,dashboard=1 --json results.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCH_DIR)
+
+SEED_FILE = os.path.join(SERVER_DIR, "TutorTech_db_demo_FIXED.sql")
+BENCH_SCHEMA_FILE = os.path.join(BENCH_DIR, "bench_schema.sql")
+MIGRATIONS_FILE = os.path.join(SERVER_DIR, "TutorTech_db_demo.sql")
+MIGRATION_SECTIONS = (11, 12, 13)   # grading cache, progress rollups, session versions
+
+CHAT_PROMPTS = [
+    "What is measurement uncertainty?",
+    "How does calibration make an instrument traceable to a standard?",
+    "Explain the difference between accuracy and precision.",
+    "What is a factorial design in DOE?",
+    "Why do control charts use three sigma limits?",
+    "How does doping change the conductivity of a semiconductor?",
+    "What is the difference between Raman and infrared spectroscopy?",
+    "Can you give me an example?",
+    "explain more",
+    "Why?",
+]
+BOT_TYPES = ["Tutor", "Mentor", "Co-Learner", "Custom"]
+
+
+# ------------------------ Throwaway Database ------------------------
+def migration_section(number):
+    sql = open(MIGRATIONS_FILE, encoding="utf-8").read()
+    match = re.search(r"-+ \(%d\) .*?(?=\n-+ \(\d+\) |\Z)" % number, sql, re.S)
+    return match.group(0)
+
+
+def create_bench_database(admin_dsn):
+    """Create and seed a fresh database; returns its name and connection parameters."""
+    name = f"tutortech_bench_{os.getpid()}"
+    admin = psycopg2.connect(admin_dsn)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f"DROP DATABASE IF EXISTS {name}")
+        cur.execute(f"CREATE DATABASE {name}")
+    admin.close()
+
+    params = psycopg2.extensions.parse_dsn(admin_dsn)
+    params["dbname"] = name
+    conn = psycopg2.connect(**params)
+    with conn, conn.cursor() as cur:
+        cur.execute(open(SEED_FILE, encoding="utf-8").read())
+        cur.execute(open(BENCH_SCHEMA_FILE, encoding="utf-8").read())
+        for number in MIGRATION_SECTIONS:
+            cur.execute(migration_section(number))
+    conn.close()
+    return name, params
+
+
+def drop_bench_database(admin_dsn, name):
+    admin = psycopg2.connect(admin_dsn)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)")
+    admin.close()
+
+
+def load_fixtures(params):
+    """Bench users and, per assignment, its course and questions (to build submissions)."""
+    conn = psycopg2.connect(**params)
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("SELECT user_id FROM student_information WHERE user_id LIKE 'bench%' ORDER BY user_id")
+        users = [row["user_id"] for row in cur.fetchall()]
+        cur.execute("""
+            SELECT ca.assignment_id, cm.course_code, aq.question_id, aq.question_type,
+                   aq.options, aq.correct_answer
+            FROM course_assignments ca
+            JOIN course_modules cm ON cm.id = ca.module_id
+            JOIN assignment_questions aq ON aq.assignment_id = ca.assignment_id
+            ORDER BY ca.assignment_id, aq.question_id
+        """)
+        assignments = {}
+        for row in cur.fetchall():
+            assignment = assignments.setdefault(
+                row["assignment_id"], {"course_code": row["course_code"], "questions": []}
+            )
+            assignment["questions"].append(row)
+    conn.close()
+    return users, assignments
+
+
+# ------------------------ Stand-in Processes ------------------------
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(url, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args[0]} exited with code {process.returncode}")
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return
+        except urllib.error.HTTPError:
+            return   # listening; the route itself answered
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def start_fake_openai(args):
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, "fake_openai.py"),
+        "--port", str(port),
+        "--chat-latency", str(args.chat_latency),
+        "--token-latency", str(args.token_latency),
+        "--embedding-latency", str(args.embedding_latency),
+        "--tokens", str(args.tokens),
+    ])
+    wait_until_ready(f"http://127.0.0.1:{port}/", process)
+    return process, f"http://127.0.0.1:{port}/v1"
+
+
+def start_server(args, db_params, openai_url):
+    port = free_port()
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="bench",
+        SECRET_KEY="bench",
+        OPENAI_BASE_URL=openai_url,
+        QDRANT_HOST=":memory:",
+        QDRANT_API_KEY="",
+        DB_HOST=db_params.get("host", ""),
+        DB_PORT=db_params.get("port", "5432"),
+        DB_NAME=db_params["dbname"],
+        DB_USER=db_params.get("user", ""),
+        DB_PASSWORD=db_params.get("password", ""),
+        DB_POOL_MAX=str(args.threads),
+    )
+    process = subprocess.Popen([
+        sys.executable, "-m", "gunicorn",
+        "--workers", str(args.workers),
+        "--threads", str(args.threads),
+        "--bind", f"127.0.0.1:{port}",
+        "--log-level", "warning",
+        "app:app",
+    ], cwd=SERVER_DIR, env=env,
+        stdout=subprocess.DEVNULL if args.quiet else None,
+        stderr=subprocess.DEVNULL if args.quiet else None)
+    wait_until_ready(f"http://127.0.0.1:{port}/ping", process)
+    return process, port
+
+
+# ------------------------ Load Driver ------------------------
+def build_submission(assignment_id, assignment, user_id, rng):
+    answers = {}
+    for question in assignment["questions"]:
+        if question["question_type"] == "text":
+            keywords = question["correct_answer"] if isinstance(question["correct_answer"], list) else []
+            picked = rng.sample(keywords, rng.randint(0, len(keywords)))
+            answers[str(question["question_id"])] = f"It is about {' and '.join(picked) or 'something else'}."
+        else:
+            choices = (question["options"] or {}).get("choices") or [question["correct_answer"]]
+            answers[str(question["question_id"])] = rng.choice(choices)
+    return {"user_id": user_id, "course_code": assignment["course_code"], "answers": answers}
+
+
+def build_request(endpoint, users, assignments, rng, stream):
+    user_id = rng.choice(users)
+    if endpoint == "chat":
+        body = {
+            "userId": user_id,
+            "botType": rng.choice(BOT_TYPES),
+            "prompt": rng.choice(CHAT_PROMPTS),
+            "historyEnabled": True,
+            "stream": stream,
+        }
+        return "POST", "/api/chat", body
+    if endpoint == "submit":
+        assignment_id = rng.choice(sorted(assignments))
+        body = build_submission(assignment_id, assignments[assignment_id], user_id, rng)
+        return "POST", f"/api/assignments/{assignment_id}/submit", body
+    return "GET", f"/api/dashboard/{user_id}", None
+
+
+def run_client(port, mix, users, assignments, args, seed, stop_at, record_from, samples):
+    rng = random.Random(seed)
+    endpoints = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=args.request_timeout)
+
+    while time.time() < stop_at:
+        endpoint = rng.choices(endpoints, weights)[0]
+        method, path, body = build_request(endpoint, users, assignments, rng, args.stream)
+        payload = json.dumps(body) if body is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+
+        started = time.perf_counter()
+        try:
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            ok = False
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=args.request_timeout)
+        elapsed = time.perf_counter() - started
+
+        if time.time() >= record_from:
+            samples.append((endpoint, elapsed, ok))
+
+    connection.close()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, duration):
+    report = {}
+    for endpoint in sorted({endpoint for endpoint, _, _ in samples}) + ["all"]:
+        latencies = sorted(
+            elapsed for name, elapsed, _ in samples if endpoint in ("all", name)
+        )
+        errors = sum(1 for name, _, ok in samples if endpoint in ("all", name) and not ok)
+        report[endpoint] = {
+            "requests": len(latencies),
+            "errors": errors,
+            "rps": len(latencies) / duration,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+        }
+    return report
+
+
+def print_report(report, args):
+    print()
+    print(f"{args.duration:.0f}s measured, {args.concurrency} clients, "
+          f"{args.workers} worker(s) x {args.threads} thread(s), mix {args.mix}")
+    print(f"{'endpoint':<12}{'requests':>10}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, row in report.items():
+        print(f"{endpoint:<12}{row['requests']:>10}{row['errors']:>8}{row['rps']:>9.1f}"
+              f"{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}")
+
+
+def parse_mix(text):
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("chat", "submit", "dashboard"):
+            raise argparse.ArgumentTypeError(f"unknown endpoint in mix: {name}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pg-dsn", default=os.getenv("BENCH_PG_DSN", "dbname=postgres"),
+                        help="libpq DSN of a server where a throwaway database may be created")
+    parser.add_argument("--mix", default="chat=6,submit=2,dashboard=2",
+                        help="weighted endpoint mix, e.g. chat=6,submit=2,dashboard=2")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before measuring")
+    parser.add_argument("--concurrency", type=int, default=16, help="client threads")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=16, help="gunicorn threads per worker")
+    parser.add_argument("--stream", action="store_true", help="request streamed chat answers")
+    parser.add_argument("--chat-latency", type=float, default=0.5)
+    parser.add_argument("--token-latency", type=float, default=0.005)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--tokens", type=int, default=120)
+    parser.add_argument("--request-timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--keep-db", action="store_true", help="leave the bench database in place")
+    parser.add_argument("--quiet", action="store_true", help="hide server output")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    processes = []
+    db_name = None
+    try:
+        db_name, db_params = create_bench_database(args.pg_dsn)
+        users, assignments = load_fixtures(db_params)
+        print(f"Seeded {db_name}: {len(users)} users, {len(assignments)} assignments")
+
+        fake_openai, openai_url = start_fake_openai(args)
+        processes.append(fake_openai)
+        server, port = start_server(args, db_params, openai_url)
+        processes.append(server)
+        print(f"Server on 127.0.0.1:{port}, fake OpenAI on {openai_url}")
+
+        samples = []   # list.append is atomic, so client threads share it
+        record_from = time.time() + args.warmup
+        stop_at = record_from + args.duration
+        clients = [
+            threading.Thread(
+                target=run_client,
+                args=(port, mix, users, assignments, args, args.seed + i, stop_at, record_from, samples),
+            )
+            for i in range(args.concurrency)
+        ]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+
+        report = summarize(samples, args.duration)
+        print_report(report, args)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"config": vars(args), "endpoints": report}, f, indent=2)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+        if db_name and not args.keep_db:
+            drop_bench_database(args.pg_dsn, db_name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark for the chat PII scanner (app.detect_personal_info).
+
+Times the compiled single-pass scanner against the original six-pattern
+implementation on realistic chat prompts and on adversarial inputs built to
+trigger regex backtracking, and checks that both agree on every input.
+
+Usage (from the server/ directory):
+    python bench/pii_benchmark.py
+    python bench/pii_benchmark.py --repeat 20 --legacy-max 8000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SECRET_KEY", "bench")   # app refuses to import without one
+
+from app import detect_personal_info  # noqa: E402
+
+
+# ------------------------ Original Implementation ------------------------
+LEGACY_PATTERNS = [
+    r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}",
+    r"\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}",
+    r"\d{1,5}\s+\w+(\s\w+){1,5}",
+    r"\b\d{5}(-\d{4})?\b",
+    r"\b\d{3}-\d{2}-\d{4}\b",
+    r"\b(?:\d[ -]*?){13,16}\b",
+]
+
+
+def legacy_contains_personal_info(text):
+    for pattern in LEGACY_PATTERNS:
+        if re.search(pattern, text):
+            return True
+    return False
+
+
+# ------------------------ Inputs ------------------------
+REALISTIC = {
+    "short question": "What is measurement uncertainty?",
+    "explain button": (
+        "Explain why the correct answer to the question 'What does measurement uncertainty "
+        "describe?' is 'Deviation from exact' and why my answer 'Precision' was wrong."
+    ),
+    "pasted notes": (
+        "Lecture 3 notes: calibration establishes the relationship between the values indicated "
+        "by an instrument and the corresponding values realized by standards. " * 30
+    ),
+    "numbers in text": "We measured 12 samples at 3 temperatures and got a mean of 4.52 mm. " * 20,
+    "email": "Can you email me at student.name@nau.edu with the answer?",
+    "phone": "My number is (928) 555-0142, text me.",
+    "address": "I live at 1900 S Knoles Drive in Flagstaff.",
+    "credit card": "Is 4111 1111 1111 1111 a valid test card?",
+}
+
+
+def adversarial(size):
+    return {
+        f"letters x{size}": "a" * size,
+        f"email local part x{size}": "a.b" * (size // 3) + "@",
+        f"long digit run x{size}": "1" * size,
+        f"digit-dash pairs x{size}": "12-" * (size // 3),
+        f"digit space pairs x{size}": "1 " * (size // 2),
+        f"separator run x{size}": "1" + " -" * (size // 2) + "x",
+    }
+
+
+# ------------------------ Timing ------------------------
+def best_time(fn, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per input; the best time is reported")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2000, 8000, 32000],
+                        help="adversarial input sizes in characters")
+    parser.add_argument("--legacy-max", type=int, default=8000,
+                        help="skip the legacy scanner on inputs longer than this (it is quadratic)")
+    args = parser.parse_args()
+
+    cases = dict(REALISTIC)
+    for size in args.sizes:
+        cases.update(adversarial(size))
+
+    print(f"{'input':<32}{'chars':>8}{'category':>14}{'new ms':>10}{'legacy ms':>12}")
+    mismatches = 0
+    for name, text in cases.items():
+        category = detect_personal_info(text)
+        new_ms = best_time(detect_personal_info, text, args.repeat)
+
+        if len(text) <= args.legacy_max:
+            legacy_ms = f"{best_time(legacy_contains_personal_info, text, args.repeat):.3f}"
+            if legacy_contains_personal_info(text) != (category is not None):
+                mismatches += 1
+                legacy_ms += " !"
+        else:
+            legacy_ms = "skipped"
+
+        print(f"{name:<32}{len(text):>8}{str(category):>14}{new_ms:>10.3f}{legacy_ms:>12}")
+
+    if mismatches:
+        print(f"\n{mismatches} input(s) where the scanners disagree (marked with !)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
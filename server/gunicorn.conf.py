@@ -0,0 +1,14 @@
+# gunicorn settings for the TutorTech server, picked up automatically when
+# gunicorn is started from server/ (e.g. `gunicorn app:app`).
+
+
+def on_starting(server):
+    # Provision the Qdrant collection once in the master instead of on every
+    # worker import. A slow or unreachable Qdrant is logged, not fatal: workers
+    # still boot and serve everything that does not need chat history.
+    from app import bootstrap_qdrant
+
+    try:
+        bootstrap_qdrant()
+    except Exception as e:
+        server.log.error(f"Qdrant bootstrap failed: {e}")